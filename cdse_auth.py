@@ -0,0 +1,90 @@
+import json
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# ✅ Hardcoded credential paths
+CREDENTIALS_FILE = "Data/credentials/credentials.json"
+ACCESS_TOKEN_FILE = "Data/credentials/access_token.json"
+TOKEN_URL = "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token"
+PROCESS_URL = "https://sh.dataspace.copernicus.eu/api/v1/process"
+
+# Pooled HTTPS session for the token and Process API calls: connections are reused
+# across dates/tiles, and rate limits (429) or transient server errors are retried
+# with backoff. Process API requests only render data, so retrying the POST is safe.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=16,
+    max_retries=Retry(total=5, backoff_factor=1.5, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=["POST"], raise_on_status=False),
+))
+
+# Serializes token renewals between concurrent downloads, across the NDVI and topo stages
+_token_lock = threading.Lock()
+
+def load_access_token():
+    """Load the saved access token."""
+    try:
+        with open(ACCESS_TOKEN_FILE, "r") as f:
+            return json.load(f).get("access_token")
+    except FileNotFoundError:
+        return None  # No token saved yet
+    except Exception as e:
+        logger.error(f"ERROR: Could not load access token: {e}")
+        return None
+
+def generate_new_access_token():
+    """Generate and save a new access token."""
+    try:
+        with open(CREDENTIALS_FILE, "r") as f:
+            creds = json.load(f)
+            username, password = creds.get("username"), creds.get("password")
+
+        if not username or not password:
+            logger.error("ERROR: Missing username or password in credentials.")
+            return None
+
+        payload = {
+            "client_id": "cdse-public",
+            "username": username,
+            "password": password,
+            "grant_type": "password"
+        }
+
+        logger.info("INFO: Requesting new access token...")
+        response = SESSION.post(TOKEN_URL, data=payload)
+
+        if response.status_code == 200:
+            access_token = response.json().get("access_token")
+            with open(ACCESS_TOKEN_FILE, "w") as f:
+                json.dump({"access_token": access_token}, f)
+            logger.info("INFO: New access token saved.")
+            return access_token
+        else:
+            logger.error(f"ERROR: Failed to obtain token: {response.text}")
+
+    except Exception as e:
+        logger.error(f"ERROR: Exception during token generation: {e}")
+
+    return None
+
+def get_access_token():
+    """Return the saved access token, generating a new one only if none is saved."""
+    # Opened directly: a missing file is one failed open rather than a stat and an open
+    access_token = load_access_token()
+    if access_token:
+        return access_token
+    return generate_new_access_token()
+
+def renew_access_token(expired_token):
+    """Replace a token the API rejected (401); concurrent requests renew it only once."""
+    with _token_lock:
+        access_token = load_access_token()
+        if access_token and access_token != expired_token:
+            return access_token  # Already renewed by another request
+        return generate_new_access_token()
@@ -4,15 +4,82 @@
 import os
 import sys
 import argparse
+import calendar
+import hashlib
+import json
+import logging
+import threading
+from logging.handlers import MemoryHandler, RotatingFileHandler
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from datetime import datetime
+from pathlib import Path
 import cdsapi
 import geopandas as gpd
+import pyogrio
+import pyproj
+import requests
 import xarray as xr
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+logger = logging.getLogger("climate")
+
+CSV_WRITE_BUFFER_BYTES = 8 << 20  # 8 MiB
+PARQUET_ROW_GROUP_SIZE = 200_000
+H5_CHUNK_CACHE = {'rdcc_nbytes': 256 * 1024 * 1024, 'rdcc_nslots': 1_000_003}
+
+# Download cache: NetCDFs recorded in the manifest are not fetched again
+MANIFEST_NAME = ".manifest.json"
+MIN_NC_BYTES = 1024
+DOWNLOAD_CHUNK_BYTES = 1 << 20  # 1 MiB
+_manifest_lock = threading.Lock()
+
+CLIMATE_VARIABLES = [
+    "t2m",    # 2 metre temperature
+    "tp",     # Total precipitation
+    "u10",    # 10 metre U wind component
+    "v10",    # 10 metre V wind component
+    "d2m",    # 2 metre dewpoint temperature
+    "ssrd",   # Surface short-wave (solar) radiation
+    "swvl1"   # Volumetric soil water layer 1
+]
+
+def setup_logging(log_file=None, buffered=True):
+    """
+    Send the climate logger to stdout (and optionally a rotating log file).
+    When buffered, routine lines are flushed in batches of 100, or at once on an error.
+    """
+    formatter = logging.Formatter("%(asctime)s %(message)s")
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+    if buffered:
+        logger.addHandler(MemoryHandler(capacity=100, flushLevel=logging.ERROR, target=stream_handler))
+    else:
+        logger.addHandler(stream_handler)
+
+    if log_file is not None:
+        file_handler = RotatingFileHandler(log_file, maxBytes=5 * 1024 * 1024, backupCount=3)
+        file_handler.setFormatter(formatter)
+        logger.addHandler(file_handler)
+    logger.setLevel(logging.INFO)
+
+def _parse_date(value):
+    """
+    argparse type for YYYY-MM-DD dates.
+    """
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}': must be in YYYY-MM-DD format")
 
 def parse_arguments():
     """
-    Parse command-line arguments specific to climate data processing.
+    Parse and validate command-line arguments specific to climate data processing.
+    Dates are returned as datetimes; a start date after the end date is rejected here.
     """
     parser = argparse.ArgumentParser(description="Climate Data Processing")
     parser.add_argument(
@@ -23,13 +90,13 @@ def parse_arguments():
     )
     parser.add_argument(
         "--start_date",
-        type=str,
+        type=_parse_date,
         required=True,
         help="Start date in YYYY-MM-DD format"
     )
     parser.add_argument(
         "--end_date",
-        type=str,
+        type=_parse_date,
         required=True,
         help="End date in YYYY-MM-DD format"
     )
@@ -39,172 +106,677 @@ def parse_arguments():
         required=True,
         help="Directory to save processed climate data"
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--legacy_csv",
+        action="store_true",
+        help="Go through an intermediate CSV and write mapped data as CSV instead of Parquet"
+    )
+    parser.add_argument(
+        "--hours",
+        type=int,
+        nargs="+",
+        default=[12],
+        help="UTC hours of each day to request, e.g. 0 6 12 18 (default: 12)"
+    )
+    args = parser.parse_args()
+    if args.start_date > args.end_date:
+        parser.error("start date must be before or equal to end date")
+    if any(not 0 <= hour <= 23 for hour in args.hours):
+        parser.error("hours must be between 0 and 23")
+    return args
 
-def get_bounding_box(shapefile_path):
+def resolve_shapefile(province):
     """
-    Calculate the bounding box (north, west, south, east) from a shapefile.
+    Return the grid shapefile path for a province, exiting if it does not exist.
+    """
+    shapefile_path = Path("Data", "grid", province, f"{province.lower()}_grid.shp")
+    try:
+        shapefile_path.stat()
+    except FileNotFoundError:
+        logger.error(f"Error: Shapefile for province '{province}' not found at {shapefile_path}.")
+        sys.exit(1)
+    return shapefile_path
+
+@dataclass(frozen=True)
+class GridLattice:
+    """
+    A grid of equal, axis-aligned rectangular cells in the grid's own CRS.
+    Points are assigned to cells with arithmetic instead of a spatial index.
+    """
+    to_grid: pyproj.Transformer  # EPSG:4326 -> grid CRS
+    x0: float
+    y0: float
+    dx: float
+    dy: float
+    cells: np.ndarray  # (ny, nx) row position in the grid, -1 where there is no cell
+
+def build_lattice(grid_gdf):
+    """
+    Return a GridLattice for grid_gdf (in its native CRS), or None if the
+    cells are not a regular lattice of full rectangles.
+    """
+    bounds = grid_gdf.geometry.bounds.to_numpy()
+    widths = bounds[:, 2] - bounds[:, 0]
+    heights = bounds[:, 3] - bounds[:, 1]
+    dx, dy = widths[0], heights[0]
+    if not (np.allclose(widths, dx) and np.allclose(heights, dy)):
+        return None
+    # Clipped or rotated cells do not fill their bounding box
+    if not np.allclose(grid_gdf.geometry.area.to_numpy(), dx * dy):
+        return None
+
+    x0, y0 = bounds[:, 0].min(), bounds[:, 1].min()
+    ix = np.rint((bounds[:, 0] - x0) / dx).astype(np.intp)
+    iy = np.rint((bounds[:, 1] - y0) / dy).astype(np.intp)
+    if not (np.allclose(bounds[:, 0], x0 + ix * dx, atol=dx * 1e-6)
+            and np.allclose(bounds[:, 1], y0 + iy * dy, atol=dy * 1e-6)):
+        return None
+
+    cells = np.full((iy.max() + 1, ix.max() + 1), -1, dtype=np.intp)
+    cells[iy, ix] = np.arange(len(bounds))
+    to_grid = pyproj.Transformer.from_crs("EPSG:4326", grid_gdf.crs, always_xy=True)
+    return GridLattice(to_grid, x0, y0, dx, dy, cells)
+
+def _lattice_query(lattice, lon, lat):
+    """
+    Vectorized point-to-cell assignment on a GridLattice.
+    Returns (point_idx, cell_idx) like a spatial-index bulk query.
+    """
+    x, y = lattice.to_grid.transform(lon, lat)
+    ix = np.floor((np.asarray(x) - lattice.x0) / lattice.dx)
+    iy = np.floor((np.asarray(y) - lattice.y0) / lattice.dy)
+    ny, nx = lattice.cells.shape
+    inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+
+    cell_idx = np.full(len(ix), -1, dtype=np.intp)
+    cell_idx[inside] = lattice.cells[iy[inside].astype(np.intp), ix[inside].astype(np.intp)]
+    point_idx = np.flatnonzero(cell_idx >= 0)
+    return point_idx, cell_idx[point_idx]
+
+def _sindex_query(grid_gdf, lon, lat):
+    """
+    Point-to-cell assignment through the grid's spatial index, returning
+    (point_idx, cell_idx) like _lattice_query: each point gets the one cell it
+    lies within. Points on a shared cell edge are within no cell; they keep the
+    lowest-numbered cell they touch, so no point is mapped twice.
     """
-    shapefile = gpd.read_file(shapefile_path)
+    points = gpd.points_from_xy(lon, lat, crs="EPSG:4326")
+    point_idx, cell_idx = grid_gdf.sindex.query(points, predicate='within')
+
+    missed = np.setdiff1d(np.arange(len(points)), point_idx)
+    if len(missed):
+        edge_idx, edge_cells = grid_gdf.sindex.query(points[missed], predicate='intersects')
+        order = np.lexsort((edge_cells, edge_idx))
+        edge_idx, edge_cells = edge_idx[order], edge_cells[order]
+        edge_idx, first = np.unique(edge_idx, return_index=True)
+        point_idx = np.concatenate([point_idx, missed[edge_idx]])
+        cell_idx = np.concatenate([cell_idx, edge_cells[first]])
+        order = np.argsort(point_idx, kind='stable')
+        point_idx, cell_idx = point_idx[order], cell_idx[order]
+    return point_idx, cell_idx
+
+def load_grid(shapefile_path):
+    """
+    Load the grid shapefile once, in EPSG:4326, plus its GridLattice if the
+    cells are regular. The spatial index is only built when there is no lattice.
+    """
+    grid_gdf = gpd.read_file(shapefile_path, engine="pyogrio", use_arrow=True)
+    lattice = build_lattice(grid_gdf)
 
     # Ensure CRS is EPSG:4326
-    if shapefile.crs.to_epsg() != 4326:
-        shapefile = shapefile.to_crs("EPSG:4326")
-    bounds = shapefile.total_bounds  # [west, south, east, north]
-    bbox = [bounds[3], bounds[0], bounds[1], bounds[2]]  # [north, west, south, east]
-    print(f"Bounding Box: {bbox}")
+    if grid_gdf.crs.to_epsg() != 4326:
+        grid_gdf = grid_gdf.to_crs("EPSG:4326")
+    if lattice is None:
+        grid_gdf.sindex  # Build the R-tree now so every month reuses it
+    return grid_gdf, lattice
+
+def _read_cell_bounds(shapefile_path):
+    """
+    Extent, CRS and per-cell bounds (minx, miny, maxx, maxy arrays) of a grid.
+    A GeoParquet copy of the grid (see grid_cache.write_geoparquet) at least as
+    new as the shapefile is read instead: its metadata and 'bbox' column only.
+    The cell bounds are read lazily, as a callable, since EPSG:4326 grids do
+    not need them.
+    """
+    parquet_path = Path(shapefile_path).with_suffix(".parquet")
+    try:
+        use_parquet = parquet_path.stat().st_mtime >= Path(shapefile_path).stat().st_mtime
+    except FileNotFoundError:
+        use_parquet = False
+
+    if use_parquet:
+        geo = json.loads(pq.read_schema(parquet_path).metadata[b"geo"])
+        column = geo["columns"][geo["primary_column"]]
+        crs = pyproj.CRS.from_json_dict(column["crs"]) if column.get("crs") else pyproj.CRS("OGC:CRS84")
+
+        def cell_bounds():
+            bbox = pq.read_table(parquet_path, columns=["bbox"]).column("bbox").combine_chunks()
+            return [bbox.field(name).to_numpy() for name in ("xmin", "ymin", "xmax", "ymax")]
+        return column["bbox"], crs, cell_bounds
+
+    info = pyogrio.read_info(shapefile_path, force_total_bounds=True)
+    return info["total_bounds"], pyproj.CRS.from_user_input(info["crs"]), lambda: pyogrio.read_bounds(shapefile_path)[1]
+
+def _compute_bounding_box(shapefile_path):
+    """
+    Calculate the bounding box (north, west, south, east) from a shapefile.
+    Only the extent stored in the file header is read when the grid is already
+    in EPSG:4326; otherwise each cell's stored bounds, but no geometries.
+    """
+    total_bounds, crs, cell_bounds = _read_cell_bounds(shapefile_path)
+    west, south, east, north = total_bounds
+
+    # Ensure CRS is EPSG:4326. Transforming the whole extent of a projected grid
+    # would give a rotated, much larger box, so the corners of every cell's bounds
+    # are transformed instead (exact for the rectangular grid cells)
+    if crs.to_epsg() != 4326 and not crs.equals("OGC:CRS84"):
+        minx, miny, maxx, maxy = cell_bounds()
+        transformer = pyproj.Transformer.from_crs(crs, "EPSG:4326", always_xy=True)
+        lon, lat = transformer.transform(np.concatenate([minx, maxx, minx, maxx]),
+                                         np.concatenate([miny, miny, maxy, maxy]))
+        west, south, east, north = lon.min(), lat.min(), lon.max(), lat.max()
+    return [float(north), float(west), float(south), float(east)]
+
+def get_bounding_box(shapefile_path):
+    """
+    Bounding box (north, west, south, east) of a grid shapefile, in EPSG:4326.
+    The box is cached in a {grid}.bbox.json sidecar next to the shapefile, keyed
+    by the .shp's mtime and size, so only a changed grid is read again.
+    """
+    shp = Path(shapefile_path)
+    sidecar = shp.with_suffix(".bbox.json")
+    stat = shp.stat()
+    key = {"mtime": stat.st_mtime, "size": stat.st_size}
+
+    try:
+        with open(sidecar, "r") as f:
+            cached = json.load(f)
+        if cached.get("mtime") == key["mtime"] and cached.get("size") == key["size"]:
+            bbox = cached["bounding_box"]
+            logger.info(f"Bounding Box: {bbox} (cached)")
+            return bbox
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    bbox = _compute_bounding_box(shapefile_path)
+    logger.info(f"Bounding Box: {bbox}")
+    # Written atomically; a read-only Data directory just means no cache
+    try:
+        tmp_path = sidecar.with_name(f"{sidecar.name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({**key, "bounding_box": bbox}, f, indent=4)
+        os.replace(tmp_path, sidecar)
+    except OSError as e:
+        logger.info(f"Could not cache bounding box in {sidecar}: {e}")
     return bbox
 
-def fetch_climate_data(bbox, year, months, output_dir):
+@dataclass(frozen=True)
+class ClimateRequest:
     """
-    Fetch climate data using CDS API.
+    One CDS retrieve: the months of a single year that share the same day list.
+    """
+    year: int
+    months: tuple
+    days: tuple
+    nc: Path  # NetCDF the request is downloaded to
+
+def plan_climate_requests(start_dt, end_dt, output_dir):
+    """
+    Split [start_dt, end_dt] into CDS requests that only ask for days inside the window.
+    Whole months of a year share one request; a partial first or last month gets its own.
+    """
+    groups = {}
+    for period in pd.period_range(start_dt, end_dt, freq="M"):
+        year, month = period.year, period.month
+        month_end = calendar.monthrange(year, month)[1]
+        first = max(start_dt, datetime(year, month, 1))
+        last = min(end_dt, datetime(year, month, month_end))
+        if first.day == 1 and last.day == month_end:
+            days = tuple(range(1, 32))  # CDS skips days a month does not have
+        else:
+            days = tuple(range(first.day, last.day + 1))
+        groups.setdefault((year, days), []).append(month)
+
+    out = Path(output_dir)
+    return [
+        ClimateRequest(
+            year=year,
+            months=tuple(months),
+            days=days,
+            nc=out / f"climate_data_{year}_{months[0]:02d}-{months[-1]:02d}.nc",
+        )
+        for (year, days), months in groups.items()
+    ]
+
+def _sha256(path):
+    """
+    SHA-256 of a file, read in 1 MiB chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _load_manifest(output_dir):
+    """
+    Load {filename: {"sha256", "params"}} for the downloads in output_dir.
+    """
+    try:
+        with open(Path(output_dir) / MANIFEST_NAME, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _record_download(path, params):
+    """
+    Add a finished download, with the CDS request parameters it was fetched with,
+    to its directory's manifest, replacing the file atomically.
+    """
+    path = Path(path)
+    digest = _sha256(path)
+    with _manifest_lock:
+        manifest = _load_manifest(path.parent)
+        manifest[path.name] = {"sha256": digest, "params": params}
+        tmp_path = path.parent / f"{MANIFEST_NAME}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp_path, path.parent / MANIFEST_NAME)
+
+def _is_downloaded(path, manifest, params):
+    """
+    True if path is a complete, readable download matching its manifest checksum,
+    fetched with the same request parameters (days, hours, area, ...).
+    """
+    try:
+        if path.stat().st_size <= MIN_NC_BYTES:
+            return False
+    except FileNotFoundError:
+        return False
+    entry = manifest.get(path.name)
+    if not isinstance(entry, dict) or entry.get("params") != params:
+        return False
+    if entry.get("sha256") != _sha256(path):
+        return False
+    try:
+        xr.open_dataset(path, engine='h5netcdf').close()
+    except Exception:
+        return False
+    return True
+
+def _is_up_to_date(target, source):
+    """
+    True if target exists and is newer than the source it was derived from.
+    """
+    try:
+        return Path(target).stat().st_mtime > Path(source).stat().st_mtime
+    except FileNotFoundError:
+        return False
+
+def _download(url, path, expected_bytes=None):
+    """
+    Stream url to path in large chunks. Data goes to a .part file that is
+    moved into place only once complete, so an interrupted download never
+    leaves a truncated NetCDF behind.
+    """
+    path = Path(path)
+    part_path = path.with_name(path.name + ".part")
+    with requests.get(url, stream=True, timeout=60) as r:
+        r.raise_for_status()
+        with open(part_path, 'wb') as f:
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                f.write(chunk)
+    size = part_path.stat().st_size
+    if expected_bytes and size != expected_bytes:
+        part_path.unlink()
+        raise IOError(f"Download incomplete: {size} of {expected_bytes} bytes")
+    os.replace(part_path, path)
+
+def _request_params(bbox, request, hours):
+    """
+    CDS API parameters for one ClimateRequest (JSON-serialisable, so they are
+    also recorded in the download manifest).
+    """
+    return {
+        'product_type': 'reanalysis',
+        'variable': [
+            '2m_temperature'
+            # '2m_temperature', 'total_precipitation', '10m_u_component_of_wind',
+            # '10m_v_component_of_wind', '2m_dewpoint_temperature',
+            # 'surface_solar_radiation_downwards', 'volumetric_soil_water_layer_1',
+        ],
+        'year': str(request.year),
+        'month': [f"{month:02d}" for month in request.months],
+        'day': [f"{day:02d}" for day in request.days],
+        'time': [f"{hour:02d}:00" for hour in hours],
+        'area': [float(coord) for coord in bbox],  # north, west, south, east
+        'format': 'netcdf',
+    }
+
+def _retrieve_one(bbox, request, hours):
+    """
+    Retrieve one ClimateRequest from the CDS API.
+    Each call builds its own client so retrievals can run on separate threads.
     """
-    print("Starting data fetch from CDS API...")
     c = cdsapi.Client()
-    for month in months:
-        filename = f"climate_data_{year}_{month:02d}.nc"
-        filepath = os.path.join(output_dir, filename)
-        print(f"Fetching data for {year}-{month:02d}...")
-        try:
-            c.retrieve(
-                'reanalysis-era5-single-levels',
-                {
-                    'product_type': 'reanalysis',
-                    'variable': [
-                        '2m_temperature'
-                        # '2m_temperature', 'total_precipitation', '10m_u_component_of_wind',
-                        # '10m_v_component_of_wind', '2m_dewpoint_temperature',
-                        # 'surface_solar_radiation_downwards', 'volumetric_soil_water_layer_1',
-                    ],
-                    'year': str(year),
-                    'month': f"{month:02d}",
-                    'day': [f"{day:02d}" for day in range(1, 32)],
-                    'time': '12:00',
-                    'area': bbox,  # north, west, south, east
-                    'format': 'netcdf',
-                },
-                filepath)
-            print(f"Climate data saved to {filepath}.")
-        except Exception as e:
-            print(f"Error fetching climate data for {year}-{month:02d}: {e}")
-            sys.exit(1)
-
-def convert_nc_to_csv(nc_file, csv_file, variables):
+    params = _request_params(bbox, request, hours)
+    # Without a target, retrieve only waits for the result; the file is streamed below
+    result = c.retrieve('reanalysis-era5-single-levels', params)
+    _download(result.location, request.nc, getattr(result, "content_length", None))
+    _record_download(request.nc, params)
+
+def fetch_climate_data(bbox, climate_requests, hours=(12,), max_workers=5):
+    """
+    Fetch climate data using CDS API.
+    All requests (see plan_climate_requests) are submitted at once so their
+    CDS queue waits overlap. Requests already downloaded by an earlier run with the
+    same parameters (days, hours, area) are skipped.
+    """
+    logger.info("Starting data fetch from CDS API...")
+    manifest = _load_manifest(climate_requests[0].nc.parent) if climate_requests else {}
+    pending = []
+    for request in climate_requests:
+        if _is_downloaded(request.nc, manifest, _request_params(bbox, request, hours)):
+            logger.info(f"Skipping {request.nc.name}: already downloaded.")
+        else:
+            pending.append(request)
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futures = {ex.submit(_retrieve_one, bbox, request, hours): request for request in pending}
+        for future in as_completed(futures):
+            request = futures[future]
+            try:
+                future.result()
+                logger.info(f"Climate data saved to {request.nc}.")
+            except Exception as e:
+                logger.error(f"Error fetching climate data for {request.nc.name}: {e}")
+                failed.append(request)
+
+    if failed:
+        logger.error(f"Error: {len(failed)} of {len(climate_requests)} climate data requests failed.")
+        sys.exit(1)
+
+def _iter_time_blocks(ds, variables):
+    """
+    Yield (timestamp, block) for each time step of the dataset.
+    block is a preallocated float32 array of lat, lon and one column per variable;
+    it is refilled in place on every step, so copy it if it must outlive the step.
+    """
+    time_dim, lat_dim, lon_dim = ds[variables[0]].dims
+    lat, lon = np.meshgrid(ds[lat_dim].values, ds[lon_dim].values, indexing='ij')
+    times = pd.DatetimeIndex(ds[time_dim].values)
+
+    block = np.empty((lat.size, 2 + len(variables)), dtype=np.float32)
+    block[:, 0] = lat.ravel()
+    block[:, 1] = lon.ravel()
+    for i, timestamp in enumerate(times):
+        for j, v in enumerate(variables):
+            # Only this time step is read from disk
+            block[:, 2 + j] = ds[v].variable[{time_dim: i}].values.ravel()
+        yield timestamp, block
+
+# Datasets opened by this process, keyed by path. A CDS request covers several
+# months, so a worker keeps each file (and its warm chunk cache) open for all of them.
+_OPEN_DATASETS = {}
+
+def _open_nc(nc_file, time_slice=None):
+    """
+    Open a NetCDF file, optionally restricted to a time range.
+    The file is opened once per process and reused by later calls.
+    """
+    key = os.fspath(nc_file)
+    ds = _OPEN_DATASETS.get(key)
+    if ds is None:
+        # h5netcdf with an enlarged HDF5 chunk cache; reads then follow the
+        # (time, lat, lon) chunk layout one time step at a time
+        ds = xr.open_dataset(nc_file, engine='h5netcdf', cache=False, driver_kwds=H5_CHUNK_CACHE)
+        _OPEN_DATASETS[key] = ds
+    if time_slice is not None:
+        # Current CDS NetCDFs name the time dimension valid_time; older ones, time
+        time_dim = next(dim for dim in ("valid_time", "time") if dim in ds.dims)
+        ds = ds.sel({time_dim: time_slice})
+    return ds
+
+def _time_block_schema(ds, variables):
+    """
+    Arrow schema for the rows produced by _iter_time_blocks.
+    """
+    columns = list(ds[variables[0]].dims) + variables
+    return pa.schema(
+        [(columns[0], pa.timestamp('ns'))] + [(c, pa.float32()) for c in columns[1:]]
+    )
+
+def _iter_time_tables(ds, variables, schema, rows_per_table=PARQUET_ROW_GROUP_SIZE,
+                      rows=None, extra_columns=()):
+    """
+    Group the blocks from _iter_time_blocks into Arrow tables of roughly
+    rows_per_table rows, so writers are not handed one tiny table per time step.
+    If rows is given, only those rows of each block are kept; extra_columns are
+    arrays (one value per kept row) appended after the block's columns.
+    """
+    extra_arrays = [pa.array(column) for column in extra_columns]
+    pending, pending_rows = [], 0
+    for timestamp, block in _iter_time_blocks(ds, variables):
+        if rows is not None:
+            block = block[rows]
+        times = np.full(len(block), timestamp.to_datetime64(), dtype='datetime64[ns]')
+        arrays = [pa.array(times)] + [
+            pa.array(np.ascontiguousarray(block[:, j])) for j in range(block.shape[1])
+        ] + extra_arrays
+        pending.append(pa.Table.from_arrays(arrays, schema=schema))
+        pending_rows += len(block)
+        if pending_rows >= rows_per_table:
+            yield pa.concat_tables(pending)
+            pending, pending_rows = [], 0
+    if pending:
+        yield pa.concat_tables(pending)
+
+def convert_nc_to_csv(nc_file, csv_file, variables, time_slice=None):
     """
     Convert NetCDF file to CSV for specified variables.
+    If time_slice is given, only that time range of the dataset is converted.
+    Rows are streamed per time step through Arrow's native CSV writer
+    instead of going through a pandas DataFrame.
     """
-    print(f"Converting {nc_file} to {csv_file}...")
+    logger.info(f"Converting {nc_file} to {csv_file}...")
     try:
-        ds = xr.open_dataset(nc_file)
-        data = ds[variables].to_dataframe().reset_index()
-        data.to_csv(csv_file, index=False)
-        print(f"Conversion completed: {csv_file}")
+        ds = _open_nc(nc_file, time_slice)
+        schema = _time_block_schema(ds, variables)
+
+        # Large buffer: few write() calls, no per-line flushing
+        with open(csv_file, 'wb', buffering=CSV_WRITE_BUFFER_BYTES) as f:
+            with pa_csv.CSVWriter(f, schema) as writer:
+                for table in _iter_time_tables(ds, variables, schema):
+                    writer.write_table(table)
+        logger.info(f"Conversion completed: {csv_file}")
     except Exception as e:
-        print(f"Error converting {nc_file} to CSV: {e}")
+        logger.error(f"Error converting {nc_file} to CSV: {e}")
         sys.exit(1)
 
-def map_to_grid(csv_file, shapefile_path, mapped_file):
+def map_to_grid(data_file, grid_gdf, mapped_file, lattice=None):
     """
-    Map climate data to the grid defined by the shapefile.
-    Placeholder for actual spatial mapping logic.
+    Map climate data points to the grid cells (loaded by load_grid) that contain them.
+    Points outside every grid cell are dropped. Input and output may be
+    Parquet or CSV, chosen by file extension. With a GridLattice, cells are
+    found arithmetically; otherwise through the grid's spatial index.
     """
-    print(f"Mapping {csv_file} to grid defined by {shapefile_path}...")
+    logger.info(f"Mapping {data_file} to grid ({len(grid_gdf)} cells)...")
     try:
         # Load climate data
-        climate_df = pd.read_csv(csv_file)
-
-        # Load shapefile
-        shapefile = gpd.read_file(shapefile_path)
+        if Path(data_file).suffix == ".parquet":
+            climate_df = pd.read_parquet(data_file)
+        else:
+            climate_df = pd.read_csv(data_file, engine="pyarrow")
+        lon = climate_df['longitude'].to_numpy()
+        lat = climate_df['latitude'].to_numpy()
 
-        # Placeholder: Implement actual mapping logic here
-        # For demonstration, we'll assume that the mapping is a simple aggregation or spatial join
-        # Replace this with your actual mapping logic as needed
+        if lattice is not None:
+            point_idx, cell_idx = _lattice_query(lattice, lon, lat)
+        else:
+            # Bulk queries against the prebuilt spatial index
+            point_idx, cell_idx = _sindex_query(grid_gdf, lon, lat)
+        mapped_df = pd.concat([
+            climate_df.take(point_idx).reset_index(drop=True),
+            grid_gdf[['grid_id']].take(cell_idx).reset_index(drop=True),
+        ], axis=1)
 
-        # Example: Save the original data as mapped data (to be replaced)
-        climate_df.to_csv(mapped_file, index=False)
-        print(f"Mapped data saved to {mapped_file}")
+        if Path(mapped_file).suffix == ".parquet":
+            mapped_df.to_parquet(mapped_file, index=False, compression='zstd')
+        else:
+            mapped_df.to_csv(mapped_file, index=False)
+        logger.info(f"Mapped data saved to {mapped_file}")
     except Exception as e:
-        print(f"Error mapping data to grid: {e}")
+        logger.error(f"Error mapping data to grid: {e}")
         sys.exit(1)
 
-def process_climate_data(province, start_date, end_date, output_dir):
+def process_month(nc_file, grid_gdf, mapped_file, variables, time_slice=None, lattice=None):
     """
-    Main function to process climate data.
+    Convert a NetCDF file straight to grid-mapped Parquet, without an
+    intermediate file. The points are the same at every time step, so they
+    are assigned to grid cells once; each step then only keeps the values of
+    points inside a cell. Output matches map_to_grid on the converted month.
     """
-    # Parse dates
+    logger.info(f"Converting and mapping {nc_file} to {mapped_file}...")
     try:
-        start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-        end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-    except ValueError:
-        print("Error: Dates must be in YYYY-MM-DD format.")
-        sys.exit(1)
+        ds = _open_nc(nc_file, time_slice)
+        _, lat_dim, lon_dim = ds[variables[0]].dims
+        lat, lon = np.meshgrid(ds[lat_dim].values, ds[lon_dim].values, indexing='ij')
+        lat, lon = lat.ravel(), lon.ravel()
+
+        if lattice is not None:
+            point_idx, cell_idx = _lattice_query(lattice, lon, lat)
+        else:
+            point_idx, cell_idx = _sindex_query(grid_gdf, lon, lat)
+        grid_ids = grid_gdf['grid_id'].to_numpy().take(cell_idx)
 
-    if start_dt > end_dt:
-        print("Error: Start date must be before or equal to end date.")
+        schema = _time_block_schema(ds, variables).append(
+            pa.field('grid_id', pa.from_numpy_dtype(grid_ids.dtype))
+        )
+        with pq.ParquetWriter(mapped_file, schema, compression='zstd') as writer:
+            for table in _iter_time_tables(ds, variables, schema,
+                                           rows=point_idx, extra_columns=[grid_ids]):
+                writer.write_table(table, row_group_size=PARQUET_ROW_GROUP_SIZE)
+        logger.info(f"Mapped data saved to {mapped_file}")
+    except Exception as e:
+        logger.error(f"Error converting and mapping {nc_file}: {e}")
         sys.exit(1)
 
-    # Determine years and months to process
-    years_months = []
-    current_year = start_dt.year
-    current_month = start_dt.month
-    while (current_year < end_dt.year) or (current_year == end_dt.year and current_month <= end_dt.month):
-        years_months.append((current_year, current_month))
-        if current_month == 12:
-            current_month = 1
-            current_year += 1
+@dataclass(frozen=True)
+class MonthPaths:
+    """
+    Resolved input/output files for one (year, month) of climate data.
+    """
+    year: int
+    month: int
+    nc: Path      # NetCDF from the CDS request covering this month
+    data: Path    # Intermediate CSV for the month (legacy_csv only)
+    mapped: Path  # Month mapped to grid cells
+
+# Grid (and its lattice, if regular) loaded once per worker process by _init_worker
+_WORKER_GRID = None
+_WORKER_LATTICE = None
+
+def _init_worker(shapefile_path):
+    """
+    Process pool initializer: load the grid (and build its R-tree) once per worker.
+    """
+    global _WORKER_GRID, _WORKER_LATTICE
+    # Worker processes exit without flushing buffered handlers (and may have
+    # inherited the parent's), so they log unbuffered to stdout only
+    logger.handlers.clear()
+    setup_logging(buffered=False)
+    _WORKER_GRID, _WORKER_LATTICE = load_grid(shapefile_path)
+
+def _process_one_month(paths, legacy_csv):
+    """
+    Convert one month of the fetched NetCDF and map it to the worker's grid.
+    """
+    logger.info(f"--- Processing {paths.year}-{paths.month:02d} ---")
+    month = f"{paths.year}-{paths.month:02d}"
+    month_slice = slice(month, month)
+
+    if not legacy_csv:
+        # Convert and map in one pass, unless an earlier run already did
+        if _is_up_to_date(paths.mapped, paths.nc):
+            logger.info(f"Skipping month: {paths.mapped} is up to date.")
         else:
-            current_month += 1
-
-    # Shapefile path
-    shapefile_dir = os.path.join("Data", "grid", province)
-    shapefile_path = os.path.join(shapefile_dir, f"{province.lower()}_grid.shp")
-    
-    if not os.path.exists(shapefile_path):
-        print(f"Error: Shapefile for province '{province}' not found at {shapefile_path}.")
-        sys.exit(1)
+            process_month(paths.nc, _WORKER_GRID, paths.mapped, CLIMATE_VARIABLES,
+                          time_slice=month_slice, lattice=_WORKER_LATTICE)
+        return
 
-    # Get bounding box
-    bbox = get_bounding_box(shapefile_path)
+    # Legacy CSV path: convert NetCDF to CSV, then map the CSV to the grid
+    if _is_up_to_date(paths.data, paths.nc):
+        logger.info(f"Skipping conversion: {paths.data} is up to date.")
+    else:
+        convert_nc_to_csv(paths.nc, paths.data, CLIMATE_VARIABLES, time_slice=month_slice)
 
-    for year, month in years_months:
-        print(f"\n--- Processing {year}-{month:02d} ---")
+    if _is_up_to_date(paths.mapped, paths.data):
+        logger.info(f"Skipping mapping: {paths.mapped} is up to date.")
+    else:
+        map_to_grid(paths.data, _WORKER_GRID, paths.mapped, lattice=_WORKER_LATTICE)
 
-        # Define file paths
-        nc_file = os.path.join(output_dir, f"climate_data_{year}_{month:02d}.nc")
-        csv_file = os.path.join(output_dir, f"climate_data_{year}_{month:02d}.csv")
-        mapped_file = os.path.join(output_dir, f"mapped_climate_data_{year}_{month:02d}.csv")
+def process_climate_data(shapefile_path, start_dt, end_dt, output_dir, legacy_csv=False, hours=(12,)):
+    """
+    Main function to process climate data.
+    start_dt and end_dt are validated datetimes and shapefile_path an existing
+    grid (see parse_arguments and resolve_shapefile).
+    Each month is converted and mapped straight to Parquet; legacy_csv instead
+    goes through an intermediate CSV and writes CSV. hours are the UTC hours of
+    each day to request.
+    """
+    # Determine the CDS requests, and the years and months they cover
+    climate_requests = plan_climate_requests(start_dt, end_dt, output_dir)
+    years_months = [(r.year, month) for r in climate_requests for month in r.months]
+    nc_by_month = {(r.year, month): r.nc for r in climate_requests for month in r.months}
+
+    # Resolve every month's files once, up front
+    out = Path(output_dir)
+    ext = "csv" if legacy_csv else "parquet"
+    month_paths = [
+        MonthPaths(
+            year=year,
+            month=month,
+            nc=nc_by_month[(year, month)],
+            data=out / f"climate_data_{year}_{month:02d}.csv",
+            mapped=out / f"mapped_climate_data_{year}_{month:02d}.{ext}",
+        )
+        for year, month in years_months
+    ]
 
-        # Fetch Climate Data
-        fetch_climate_data(bbox, year, [month], output_dir)
+    # Get bounding box (the grid itself is loaded by the worker processes)
+    bbox = get_bounding_box(shapefile_path)
 
-        # Convert NetCDF to CSV
-        variables = [
-            "t2m",    # 2 metre temperature
-            "tp",     # Total precipitation
-            "u10",    # 10 metre U wind component
-            "v10",    # 10 metre V wind component
-            "d2m",    # 2 metre dewpoint temperature
-            "ssrd",   # Surface short-wave (solar) radiation
-            "swvl1"   # Volumetric soil water layer 1
-        ]
-        convert_nc_to_csv(nc_file, csv_file, variables)
+    # Fetch Climate Data for every month in one batch
+    fetch_climate_data(bbox, climate_requests, hours)
 
-        # Map to Grid
-        map_to_grid(csv_file, shapefile_path, mapped_file)
+    # Convert and map every month in parallel; months are independent once fetched
+    with ProcessPoolExecutor(
+        max_workers=min(len(month_paths), os.cpu_count() or 1),
+        initializer=_init_worker,
+        initargs=(shapefile_path,),
+    ) as ex:
+        list(ex.map(_process_one_month, month_paths, [legacy_csv] * len(month_paths)))
 
-    print("\nClimate data processing completed.")
+    logger.info("Climate data processing completed.")
 
 def main():
     args = parse_arguments()
 
     # Ensure output directory exists
     os.makedirs(args.output_dir, exist_ok=True)
+    setup_logging(log_file=os.path.join(args.output_dir, "climate.log"))
+
+    # Fail before any CDS request is made
+    shapefile_path = resolve_shapefile(args.province)
 
     process_climate_data(
-        province=args.province,
-        start_date=args.start_date,
-        end_date=args.end_date,
-        output_dir=args.output_dir
+        shapefile_path=shapefile_path,
+        start_dt=args.start_date,
+        end_dt=args.end_date,
+        output_dir=args.output_dir,
+        legacy_csv=args.legacy_csv,
+        hours=args.hours
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,115 @@
+import os
+import sys
+import geopandas as gpd
+import pyogrio
+from functools import lru_cache
+
+GEOGRAPHIC_CRS = "EPSG:4326"
+
+# Faster-to-read copies of a grid, looked for next to its .shp in this order
+GRID_FORMATS = (".parquet", ".fgb")
+
+def _grid_source(shapefile_path):
+    """
+    The file to read a grid from: a sibling in one of GRID_FORMATS when one is at
+    least as new as the .shp, otherwise the shapefile itself.
+    """
+    shp_mtime = os.path.getmtime(shapefile_path)
+    stem = os.path.splitext(shapefile_path)[0]
+    for ext in GRID_FORMATS:
+        try:
+            mtime = os.path.getmtime(stem + ext)
+        except FileNotFoundError:
+            continue
+        if mtime >= shp_mtime:
+            return stem + ext, mtime
+    return shapefile_path, shp_mtime
+
+@lru_cache(maxsize=4)
+def _read_grid(grid_path, mtime):
+    if grid_path.endswith(".parquet"):
+        # GeoParquet: WKB geometries and grid_id straight from Arrow, bbox column skipped
+        return gpd.read_parquet(grid_path, columns=["grid_id", "geometry"])
+    # pyogrio reads the whole layer in one call, straight into Arrow buffers; of the
+    # attribute table only grid_id is decoded, the one field the stages use
+    return gpd.read_file(grid_path, engine="pyogrio", use_arrow=True, columns=["grid_id"])
+
+@lru_cache(maxsize=8)
+def _load_grid(grid_path, mtime, crs):
+    grid_gdf = _read_grid(grid_path, mtime)
+    if grid_gdf.crs is None or not grid_gdf.crs.equals(crs):
+        grid_gdf = grid_gdf.to_crs(crs)
+    else:
+        grid_gdf = grid_gdf.copy()
+
+    if crs == GEOGRAPHIC_CRS:
+        # Cell centres straight from the bounds (small cells), so no polygon is reprojected
+        bounds = grid_gdf.geometry.bounds.to_numpy()
+        grid_gdf['Longitude'] = (bounds[:, 0] + bounds[:, 2]) * 0.5
+        grid_gdf['Latitude'] = (bounds[:, 1] + bounds[:, 3]) * 0.5
+    else:
+        # Same lat/lon centres in every CRS, so all stages report identical coordinates
+        geographic_gdf = _load_grid(grid_path, mtime, GEOGRAPHIC_CRS)
+        grid_gdf['Longitude'] = geographic_gdf['Longitude'].to_numpy()
+        grid_gdf['Latitude'] = geographic_gdf['Latitude'].to_numpy()
+
+    grid_gdf.sindex  # Build the R-tree now so later calls reuse it
+    return grid_gdf
+
+def load_grid(shapefile_path, crs=GEOGRAPHIC_CRS):
+    """
+    Load a grid shapefile in the given CRS, with its spatial index built and each
+    cell's EPSG:4326 centre in 'Latitude'/'Longitude' columns.
+
+    The grid is parsed once and each CRS reprojected once, cached per file
+    modification time, so the climate, fire, NDVI and topo stages of a request
+    share the same grid. Callers must not modify the returned GeoDataFrame.
+    An up-to-date GeoParquet or FlatGeobuf copy (see write_geoparquet and
+    write_flatgeobuf) is read instead of the shapefile when present.
+
+    Args:
+        shapefile_path (str): Path to the grid shapefile.
+        crs (str): Target CRS, e.g. "EPSG:4326" or a raster's CRS string.
+
+    Returns:
+        GeoDataFrame: The grid in the requested CRS.
+    """
+    return _load_grid(*_grid_source(shapefile_path), crs)
+
+def write_flatgeobuf(shapefile_path):
+    """
+    Write a FlatGeobuf copy of a grid shapefile next to it, for load_grid to
+    read instead. Cells keep their shapefile order (no spatial index is written).
+
+    Args:
+        shapefile_path (str): Path to the grid shapefile.
+
+    Returns:
+        str: Path of the .fgb file.
+    """
+    fgb_path = os.path.splitext(shapefile_path)[0] + ".fgb"
+    pyogrio.write_dataframe(pyogrio.read_dataframe(shapefile_path), fgb_path,
+                            driver="FlatGeobuf", SPATIAL_INDEX="NO")
+    return fgb_path
+
+def write_geoparquet(shapefile_path):
+    """
+    Write a GeoParquet copy of a grid shapefile next to it, for load_grid to
+    read instead. A 'bbox' covering column holds each cell's bounds, so a
+    bounding box can be taken without decoding any geometry.
+
+    Args:
+        shapefile_path (str): Path to the grid shapefile.
+
+    Returns:
+        str: Path of the .parquet file.
+    """
+    parquet_path = os.path.splitext(shapefile_path)[0] + ".parquet"
+    pyogrio.read_dataframe(shapefile_path).to_parquet(parquet_path, index=False, compression="zstd",
+                                                      write_covering_bbox=True)
+    return parquet_path
+
+# One-time conversion, e.g. python grid_cache.py data/grid/*/*_Grid.shp
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        print(f"✅ Written: {write_geoparquet(path)}")
@@ -1,28 +1,288 @@
 import os
+import csv
+import json
+import logging
+import tempfile
+from functools import lru_cache
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QTabWidget, QWidget, QVBoxLayout, QGridLayout,
-    QLabel, QLineEdit, QPushButton, QTextEdit, QScrollArea, QComboBox, QRadioButton, QHBoxLayout, QFileDialog, QMessageBox
+    QLabel, QLineEdit, QPushButton, QTextEdit, QScrollArea, QComboBox, QRadioButton, QHBoxLayout, QFileDialog, QMessageBox,
+    QDialog
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, QThread, QUrl, pyqtSignal
+try:
+    # Must be imported before the QApplication is created
+    from PyQt5.QtWebEngineWidgets import QWebEngineView
+except ImportError:  # Without PyQtWebEngine, Plotly figures open in the browser
+    QWebEngineView = None
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
-import geopandas as gpd
-import matplotlib.pyplot as plt
-import plotly.express as px
+import pyarrow as pa
+import pyarrow.parquet as pq
 from PyQt5.QtCore import QTimer
-from imblearn.over_sampling import SMOTE
-from imblearn.under_sampling import NearMiss
-from imblearn.combine import SMOTEENN
-from sklearn.model_selection import train_test_split
-import pandas as pd
 import numpy as np
-import subprocess
-from process_climate_data import process_climate_data
 from datetime import datetime
-import os
-from process_firehistory_data import process_fire_history
-from process_ndvi_data import process_ndvi_data
-from process_topo_data import process_topo_data
-from merge_final_dataset import merge_final_dataset
+
+# geopandas, matplotlib, plotly, imblearn and the process_* pipeline modules are
+# imported inside the handlers that use them, so the window opens without loading them
+
+# Dropdown choices
+PROVINCES = (
+    "Alberta", "British Columbia", "Manitoba", "New Brunswick",
+    "Newfoundland and Labrador", "Northwest Territories", "Nova Scotia",
+    "Nunavut", "Ontario", "Prince Edward Island", "Quebec", "Saskatchewan", "Yukon"
+)
+BALANCING_TECHNIQUES = ("SMOTE", "NearMiss-3", "SMOTE+ENN")
+SAMPLING_RATIOS = tuple(f"{i}%" for i in range(0, 101, 10))
+MODELS = ("Logistic Regression", "Random Forest", "XGBoost", "LightGBM")
+
+# Info tab contents
+INFO_HTML = """
+<p><b>Project Overview:</b></p>
+<p>This tool is designed for geospatial dataset generation, balancing, and machine learning evaluation, specifically focused on forest fire prediction. The system automates the process from data collection to model validation, ensuring efficient handling of large datasets with spatial and temporal features.</p>
+
+<p><b>Key Features:</b></p>
+<p>1. Data Collection: Fetches climate, NDVI, topographical, and fire history data from multiple sources such as Copernicus, ERA5, and CWFIS.<br>
+2. Data Balancing: Includes techniques like SMOTE, NearMiss, and SMOTE+ENN to handle data imbalance for improved model training.<br>
+3. Machine Learning Models: Supports models like Logistic Regression, Random Forest, XGBoost, and LightGBM for forest fire prediction.<br>
+4. Visualization: Provides tools for visualizing the dataset and the model's performance metrics (accuracy, precision, recall, F1-score).<br>
+5. User Customization: Allows users to define time ranges, spatial regions, and model parameters for customized data generation and analysis.</p>
+
+<p><b>Inputs:</b></p>
+<p>• Temporal Range: Define the start and end dates for data collection.<br>
+• Spatial Inputs: Select provinces or bounding boxes for specific geographic regions.<br>
+• Resampling Techniques: Choose balancing techniques and specify sampling ratios.</p>
+
+<p><b>Outputs:</b></p>
+<p>• Final Dataset: Cleaned, balanced dataset ready for training models.<br>
+• Performance Metrics: Accuracy, precision, recall, F1 score, and ROC-AUC for evaluating model effectiveness.</p>
+
+<p><b>Additional Info:</b></p>
+<p>• Platform: Built with Python using PyQt5 for the UI and integrated with various APIs for data fetching.<br>
+• Data Sources: Combines multiple datasets from sources like Copernicus, ERA5, CWFIS, and more.<br>
+• Scalability: Can handle large datasets and multiple regions, with support for different spatial and temporal resolutions.</p>
+
+<p><b>Instructions:</b></p>
+<p>1. Set up your parameters by specifying the temporal range and spatial inputs.<br>
+2. Choose your preferred data balancing method and machine learning model.<br>
+3. Click 'Run' to start the automated process, which fetches, balances, and trains a model.<br>
+4. Visualize results and download the dataset.</p>
+"""
+
+# Compact dtypes for the final dataset's columns (float32 is ample for the measurements;
+# Fire_Occurred is written as 0.0/1.0, so it stays a float)
+DATASET_DTYPES = {
+    "grid_id": "int32", "Latitude": "float32", "Longitude": "float32",
+    "Wind_Speed_U_10m": "float32", "Wind_Speed_V_10m": "float32", "Dew_Point_2m_C": "float32",
+    "Temperature_2m_C": "float32", "Surface_Pressure_Pa": "float32", "Total_Precip_mm": "float32",
+    "Total_Fire_Size": "float32", "Fire_Occurred": "float32", "ndvi": "float32",
+    "Elevation": "float32", "Slope": "float32", "Aspect": "float32",
+}
+
+# Features resampled by balance_data: the final dataset's numeric columns, with Date
+# encoded as days since the epoch (Fire_Cause is dropped)
+BALANCE_FEATURES = [col for col in DATASET_DTYPES if col != "Fire_Occurred"] + ["Date_Days"]
+
+# Balanced datasets are written as zstd Parquet; set to "csv" for plain CSV output
+BALANCED_OUTPUT_FORMAT = "parquet"
+
+# Datasets can be opened as CSV or Parquet
+DATASET_FILE_FILTER = "Datasets (*.csv *.parquet);;CSV Files (*.csv);;Parquet Files (*.parquet)"
+
+# Bootstrap sample size cap per Random Forest tree
+RF_MAX_SAMPLES = 1_000_000
+
+# Merged (shapefile + CSV) frames kept for repeated visualizations
+MERGED_CACHE_SIZE = 8
+
+# Matplotlib geometries are simplified to 1/SIMPLIFY_FRACTION of the shapefile's extent
+SIMPLIFY_FRACTION = 2000
+
+# Bundled shapefiles, resolved once relative to this file
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Data")
+# CDS credentials, where the pipeline stages read them (relative to the working directory)
+CREDENTIALS_DIR = os.path.join("Data", "credentials")
+CREDENTIALS_FILE = os.path.join(CREDENTIALS_DIR, "credentials.json")
+# Province grids, where the pipeline stages read them (relative to the working directory)
+GRID_DIR = os.path.join("Data", "Grid")
+
+# Loggers whose INFO messages are shown in the terminal; other libraries show warnings and errors only
+PIPELINE_LOGGERS = (
+    "process_climate_data", "process_firehistory_data", "process_ndvi_data",
+    "process_topo_data", "merge_final_dataset", "cdse_auth", "cdsapi",
+)
+
+# Pipeline progress lines are batched into one terminal append per interval
+TERMINAL_FLUSH_MS = 50
+# Oldest terminal lines are dropped beyond this many
+TERMINAL_MAX_BLOCKS = 5000
+
+def _available_provinces():
+    """Provinces with a grid shapefile on disk, found with one scan of GRID_DIR (all of them if none are)."""
+    try:
+        with os.scandir(GRID_DIR) as entries:
+            folders = {entry.name for entry in entries if entry.is_dir()}
+    except FileNotFoundError:
+        folders = set()
+    available = [
+        province for province in PROVINCES
+        if province in folders
+        and os.path.exists(os.path.join(GRID_DIR, province, f"{province.replace(' ', '_')}_Grid.shp"))
+    ]
+    # Without any grids here (e.g. started from another directory), let the stages report it
+    return available or list(PROVINCES)
+
+@lru_cache(maxsize=16)
+def _load_shapefile(shapefile_path):
+    """
+    Read a shapefile once; later visualizations of the same province and grid option reuse it.
+    Grid shapefiles come back indexed (and sorted) by an int32 grid_id, ready for joins.
+    """
+    import geopandas as gpd
+
+    gdf = gpd.read_file(shapefile_path, engine="pyogrio", use_arrow=True)
+    if 'grid_id' in gdf.columns:
+        gdf['grid_id'] = gdf['grid_id'].astype('int32')
+        gdf = gdf.set_index('grid_id', drop=False).sort_index()
+    return gdf
+
+def _is_parquet(file_path):
+    return file_path.lower().endswith(".parquet")
+
+def _read_dataset(file_path, columns=None):
+    """
+    Read a CSV (pyarrow engine) or Parquet dataset, optionally only some columns,
+    with known columns in DATASET_DTYPES and any other float64 columns as float32.
+    """
+    if _is_parquet(file_path):
+        df = pd.read_parquet(file_path, columns=columns)
+        df = df.astype({col: dtype for col, dtype in DATASET_DTYPES.items() if col in df.columns})
+    else:
+        df = pd.read_csv(file_path, usecols=columns, dtype=DATASET_DTYPES, engine="pyarrow")
+    float_columns = df.select_dtypes(include="float64").columns
+    if len(float_columns):
+        df[float_columns] = df[float_columns].astype("float32")
+    return df
+
+@lru_cache(maxsize=32)
+def _dataset_header(file_path, mtime, size):
+    """Column names from a CSV's header line or a Parquet schema; cached per (path, mtime, size) so edits are picked up."""
+    if _is_parquet(file_path):
+        return tuple(pq.read_schema(file_path).names)
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        return tuple(next(csv.reader(f), ()))
+
+def _dataset_columns(file_path):
+    """Column names of a CSV or Parquet dataset, without reading any rows."""
+    stat = os.stat(file_path)
+    return _dataset_header(file_path, stat.st_mtime, stat.st_size)
+
+@lru_cache(maxsize=16)
+def _load_simplified_shapefile(shapefile_path):
+    """
+    The cached shapefile with geometries simplified for Matplotlib, where detail
+    finer than about a pixel only adds path vertices to draw.
+    """
+    gdf = _load_shapefile(shapefile_path).copy()
+    minx, miny, maxx, maxy = gdf.total_bounds
+    tolerance = max(maxx - minx, maxy - miny) / SIMPLIFY_FRACTION
+    gdf['geometry'] = gdf.geometry.simplify(tolerance, preserve_topology=False)
+    return gdf
+
+@lru_cache(maxsize=16)
+def _load_geojson(shapefile_path):
+    """
+    GeoJSON FeatureCollection (EPSG:4326) of the cached shapefile for Plotly, built once.
+    Feature ids are the shapefile's index, i.e. grid_id for grid shapefiles.
+    """
+    geometry = _load_shapefile(shapefile_path).geometry
+    if geometry.crs is not None and geometry.crs.to_epsg() != 4326:
+        geometry = geometry.to_crs("EPSG:4326")
+    return geometry.to_frame().to_geo_dict(show_bbox=False)
+
+def _rows_by_grid_id(shapefile, grid_ids):
+    """
+    Match CSV grid_ids to the rows of a grid shapefile (indexed by grid_id).
+    Returns (csv_rows, shapefile_rows) in CSV order; ids not in the shapefile are dropped.
+    """
+    index = shapefile.index
+    if index.name != 'grid_id':
+        raise ValueError("The shapefile has no 'grid_id' column to join on.")
+
+    if len(index) and index.is_monotonic_increasing and index.is_unique and index[-1] - index[0] + 1 == len(index):
+        # Contiguous ids (as in the generated grids): the row of a grid_id is grid_id - first
+        positions = grid_ids - index[0]
+        csv_rows = np.flatnonzero((positions >= 0) & (positions < len(index)))
+        return csv_rows, positions[csv_rows]
+
+    # Otherwise a multithreaded Arrow hash join of row numbers on grid_id
+    csv_table = pa.table({'grid_id': pa.array(grid_ids).cast(pa.int64()), 'csv_row': np.arange(len(grid_ids))})
+    shapefile_table = pa.table({'grid_id': pa.array(index.to_numpy()).cast(pa.int64()), 'shapefile_row': np.arange(len(index))})
+    joined = csv_table.join(shapefile_table, 'grid_id', join_type='inner').sort_by('csv_row')
+    return joined['csv_row'].to_numpy(), joined['shapefile_row'].to_numpy()
+
+class LogEmitter(QObject):
+    """Carries formatted log records to the GUI thread."""
+    message = pyqtSignal(str)
+
+class QtLogHandler(logging.Handler):
+    """Logging handler that hands each record to the GUI by signal, so no thread touches the terminal widget."""
+    def __init__(self):
+        super().__init__()
+        self.emitter = LogEmitter()
+
+    def emit(self, record):
+        try:
+            self.emitter.message.emit(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+class PipelineWorker(QObject):
+    """Runs the dataset-generation pipeline off the GUI thread, reporting progress by signal."""
+    progress = pyqtSignal(str)
+    finished = pyqtSignal(str)  # Error message, empty on success
+
+    def __init__(self, province, start_date, end_date, request_id, base_output_dir):
+        super().__init__()
+        self.province = province
+        self.start_date = start_date
+        self.end_date = end_date
+        self.request_id = request_id
+        self.base_output_dir = base_output_dir
+
+    def run(self):
+        """Process the four data sources concurrently, then merge them."""
+        from process_climate_data import process_climate_data
+        from process_firehistory_data import process_fire_history
+        from process_ndvi_data import process_ndvi_data
+        from process_topo_data import process_topo_data
+        from merge_final_dataset import merge_final_dataset
+
+        # ✅ Independent, network/disk-bound sources, each writing to its own subfolder
+        steps = {
+            "Climate data": (process_climate_data, (self.province, self.start_date, self.end_date, self.base_output_dir)),
+            "Fire history": (process_fire_history, (self.province, self.start_date, self.end_date, self.base_output_dir)),
+            "NDVI data": (process_ndvi_data, (self.province, self.start_date, self.end_date, self.base_output_dir)),
+            "Topographical data": (process_topo_data, (self.province, self.base_output_dir)),
+        }
+
+        error = ""
+        try:
+            with ThreadPoolExecutor(max_workers=len(steps)) as ex:
+                futures = {ex.submit(func, *args): name for name, (func, args) in steps.items()}
+                for future in as_completed(futures):
+                    future.result()
+                    self.progress.emit(f"✅ {futures[future]} processing completed.")
+
+            # ✅ Merge all datasets
+            merge_final_dataset(self.request_id, self.start_date, self.end_date)
+            self.progress.emit(f"✅ Data processing & merging completed. Final dataset saved in: {self.base_output_dir}")
+
+        except Exception as e:
+            error = str(e)
+            self.progress.emit(f"❌ Error: {error}")
+        finally:
+            self.finished.emit(error)
 
 class ForestFireApp(QMainWindow):
     def __init__(self):
@@ -31,8 +291,25 @@ class ForestFireApp(QMainWindow):
         self.setWindowTitle("Forest Fire Dataset Generation Tool")
         self.setGeometry(100, 100, 800, 600)
 
+        # (shapefile, csv, csv mtime, column) -> merged GeoDataFrame
+        self.merged_cache = {}
+
+        # Plot windows, built on first use and reused afterwards
+        self.plot_dialog = None
+        self.plot_canvas = None
+        self.plotly_dialog = None
+        self.plotly_view = None
+
         self.initUI()
 
+        # Pipeline logging goes to the terminal (through the same buffered appender)
+        self.log_handler = QtLogHandler()
+        self.log_handler.setFormatter(logging.Formatter("%(message)s"))
+        self.log_handler.emitter.message.connect(self.queue_terminal_line, Qt.QueuedConnection)
+        logging.getLogger().addHandler(self.log_handler)
+        for name in PIPELINE_LOGGERS:
+            logging.getLogger(name).setLevel(logging.INFO)
+
     def initUI(self):
         # Create a tab widget
         self.tabs = QTabWidget()
@@ -48,6 +325,14 @@ class ForestFireApp(QMainWindow):
         self.terminal_output.setReadOnly(True)
         self.terminal_output.setStyleSheet("background-color: black; color: white; font-family: monospace;")
         self.terminal_output.setMinimumHeight(150)
+        self.terminal_output.document().setMaximumBlockCount(TERMINAL_MAX_BLOCKS)
+
+        # Progress lines waiting for the next terminal flush
+        self.terminal_buffer = []
+        self.terminal_timer = QTimer(self)
+        self.terminal_timer.setSingleShot(True)
+        self.terminal_timer.setInterval(TERMINAL_FLUSH_MS)
+        self.terminal_timer.timeout.connect(self.flush_terminal)
 
         # Clear Terminal Button
         self.clear_terminal_button = QPushButton("Clear Terminal")
@@ -76,11 +361,7 @@ class ForestFireApp(QMainWindow):
         # ----- Top-Left: Province and Date Inputs -----
         province_label = QLabel("Province:")
         self.province_dropdown = QComboBox()
-        self.province_dropdown.addItems([
-            "Alberta", "British Columbia", "Manitoba", "New Brunswick",
-            "Newfoundland and Labrador", "Northwest Territories", "Nova Scotia",
-            "Nunavut", "Ontario", "Prince Edward Island", "Quebec", "Saskatchewan", "Yukon"
-        ])
+        self.province_dropdown.addItems(_available_provinces())
 
         start_date_label = QLabel("Start Date")
         self.start_date_input = QLineEdit()
@@ -99,7 +380,7 @@ class ForestFireApp(QMainWindow):
 
         # Browse CSV Section
         browse_csv_label = QLabel("Browse CSV Input")
-        self.csv_input = QLineEdit()
+        self.class_csv_input = QLineEdit()
 
         browse_button = QPushButton("Browse CSV")
         browse_button.clicked.connect(lambda: self.browse_csv_setup('class'))
@@ -110,19 +391,19 @@ class ForestFireApp(QMainWindow):
 
         # Layout for CSV Input and Buttons
         csv_layout = QHBoxLayout()
-        csv_layout.addWidget(self.csv_input)
+        csv_layout.addWidget(self.class_csv_input)
         csv_layout.addWidget(browse_button)
         csv_layout.addWidget(self.check_distribution_button)
 
         # Balance Data Section
         balance_label = QLabel("Balance Data:")
         self.balance_dropdown = QComboBox()
-        self.balance_dropdown.addItems(["SMOTE", "NearMiss-3", "SMOTE+ENN"])
+        self.balance_dropdown.addItems(list(BALANCING_TECHNIQUES))
 
         # Sampling Ratio Dropdown
         sampling_label = QLabel("Sampling Ratio:")
         self.sampling_ratio_dropdown = QComboBox()
-        self.sampling_ratio_dropdown.addItems([f"{i}%" for i in range(0, 101, 10)])
+        self.sampling_ratio_dropdown.addItems(list(SAMPLING_RATIOS))
 
         balance_button = QPushButton("Balance Data")
         balance_button.clicked.connect(self.balance_data)
@@ -153,7 +434,7 @@ class ForestFireApp(QMainWindow):
         # ----- Bottom-Right: Model Selection and Train Button -----
         model_label = QLabel("Train Model:")
         self.model_dropdown = QComboBox()
-        self.model_dropdown.addItems(["Linear Regression", "Random Forest", "XGBoost", "LightGBM"])
+        self.model_dropdown.addItems(list(MODELS))
 
         train_button = QPushButton("Train Model")
         train_button.clicked.connect(self.train_model)
@@ -179,11 +460,11 @@ class ForestFireApp(QMainWindow):
 
     def browse_csv_setup(self, file_type):
         """Open file dialog to browse for a CSV file."""
-        file_name, _ = QFileDialog.getOpenFileName(self, "Select CSV File", "", "CSV Files (*.csv)")
+        file_name, _ = QFileDialog.getOpenFileName(self, "Select Dataset File", "", DATASET_FILE_FILTER)
 
         if file_name:
             # Update the input text field with the selected file path
-            self.csv_input.setText(file_name)
+            self.class_csv_input.setText(file_name)
             self.terminal_output.append(f"Selected {file_type} CSV file: {file_name}")
         else:
             self.terminal_output.append("No file selected.")
@@ -195,42 +476,13 @@ class ForestFireApp(QMainWindow):
 
         scroll_area = QScrollArea()
         scroll_area.setWidgetResizable(True)
-        content = QWidget()
-        content_layout = QVBoxLayout()
-
-        # Adding detailed info to the content
-        content_layout.addWidget(QLabel("<b>Project Overview:</b>"))
-        content_layout.addWidget(QLabel("This tool is designed for geospatial dataset generation, balancing, and machine learning evaluation, specifically focused on forest fire prediction. The system automates the process from data collection to model validation, ensuring efficient handling of large datasets with spatial and temporal features."))
-
-        content_layout.addWidget(QLabel("<b>Key Features:</b>"))
-        content_layout.addWidget(QLabel("1. Data Collection: Fetches climate, NDVI, topographical, and fire history data from multiple sources such as Copernicus, ERA5, and CWFIS."))
-        content_layout.addWidget(QLabel("2. Data Balancing: Includes techniques like SMOTE, NearMiss, and SMOTE+ENN to handle data imbalance for improved model training."))
-        content_layout.addWidget(QLabel("3. Machine Learning Models: Supports models like Logistic Regression, Random Forest, XGBoost, and LightGBM for forest fire prediction."))
-        content_layout.addWidget(QLabel("4. Visualization: Provides tools for visualizing the dataset and the model's performance metrics (accuracy, precision, recall, F1-score)."))
-        content_layout.addWidget(QLabel("5. User Customization: Allows users to define time ranges, spatial regions, and model parameters for customized data generation and analysis."))
-
-        content_layout.addWidget(QLabel("<b>Inputs:</b>"))
-        content_layout.addWidget(QLabel("• Temporal Range: Define the start and end dates for data collection."))
-        content_layout.addWidget(QLabel("• Spatial Inputs: Select provinces or bounding boxes for specific geographic regions."))
-        content_layout.addWidget(QLabel("• Resampling Techniques: Choose balancing techniques and specify sampling ratios."))
-
-        content_layout.addWidget(QLabel("<b>Outputs:</b>"))
-        content_layout.addWidget(QLabel("• Final Dataset: Cleaned, balanced dataset ready for training models."))
-        content_layout.addWidget(QLabel("• Performance Metrics: Accuracy, precision, recall, F1 score, and ROC-AUC for evaluating model effectiveness."))
-
-        content_layout.addWidget(QLabel("<b>Additional Info:</b>"))
-        content_layout.addWidget(QLabel("• Platform: Built with Python using PyQt5 for the UI and integrated with various APIs for data fetching."))
-        content_layout.addWidget(QLabel("• Data Sources: Combines multiple datasets from sources like Copernicus, ERA5, CWFIS, and more."))
-        content_layout.addWidget(QLabel("• Scalability: Can handle large datasets and multiple regions, with support for different spatial and temporal resolutions."))
-
-        content_layout.addWidget(QLabel("<b>Instructions:</b>"))
-        content_layout.addWidget(QLabel("1. Set up your parameters by specifying the temporal range and spatial inputs."))
-        content_layout.addWidget(QLabel("2. Choose your preferred data balancing method and machine learning model."))
-        content_layout.addWidget(QLabel("3. Click 'Run' to start the automated process, which fetches, balances, and trains a model."))
-        content_layout.addWidget(QLabel("4. Visualize results and download the dataset."))
-
-        content.setLayout(content_layout)
-        scroll_area.setWidget(content)
+
+        # All info in one rich-text label, laid out and painted as a single widget
+        info_label = QLabel(INFO_HTML)
+        info_label.setTextFormat(Qt.RichText)
+        info_label.setWordWrap(True)
+        info_label.setAlignment(Qt.AlignTop)
+        scroll_area.setWidget(info_label)
 
         layout.addWidget(scroll_area)
         info_tab.setLayout(layout)
@@ -265,11 +517,7 @@ class ForestFireApp(QMainWindow):
         # Province Selection
         layout.addWidget(QLabel("Select Province for Shapefile:"))
         self.province_dropdown_visualize = QComboBox()
-        self.province_dropdown_visualize.addItems([
-            "Alberta", "British Columbia", "Manitoba", "New Brunswick",
-            "Newfoundland and Labrador", "Northwest Territories", "Nova Scotia",
-            "Nunavut", "Ontario", "Prince Edward Island", "Quebec", "Saskatchewan", "Yukon"
-        ])
+        self.province_dropdown_visualize.addItems(list(PROVINCES))
         layout.addWidget(self.province_dropdown_visualize)
 
         # Grid Option
@@ -283,11 +531,11 @@ class ForestFireApp(QMainWindow):
 
         # CSV Upload
         layout.addWidget(QLabel("Upload CSV:"))
-        self.csv_input = QLineEdit()
+        self.viz_csv_input = QLineEdit()
         self.csv_browse_button = QPushButton("Browse")
         self.csv_browse_button.clicked.connect(self.browse_csv)
         csv_layout = QHBoxLayout()
-        csv_layout.addWidget(self.csv_input)
+        csv_layout.addWidget(self.viz_csv_input)
         csv_layout.addWidget(self.csv_browse_button)
         layout.addLayout(csv_layout)
 
@@ -317,21 +565,21 @@ class ForestFireApp(QMainWindow):
     
     def reset_visualize_tab(self):
         """Reset all fields in the Visualize tab."""
-        self.csv_input.clear()
+        self.viz_csv_input.clear()
         self.column_dropdown.clear()
         self.visualization_mode.setCurrentIndex(0)
+        self.merged_cache.clear()
         self.terminal_output.append("Visualize tab reset to initial state.")
 
     def browse_csv(self):
         """Browse and load a CSV file and populate column dropdown."""
-        file_name, _ = QFileDialog.getOpenFileName(self, "Select CSV File", "", "CSV Files (*.csv)")
+        file_name, _ = QFileDialog.getOpenFileName(self, "Select Dataset File", "", DATASET_FILE_FILTER)
         if file_name:
-            self.csv_input.setText(file_name)
+            self.viz_csv_input.setText(file_name)
             self.terminal_output.append(f"Selected CSV file: {file_name}")
             try:
-                df = pd.read_csv(file_name)
                 excluded_columns = {'grid_id', 'date', 'latitude', 'longitude'}
-                available_columns = [col for col in df.columns if col not in excluded_columns]
+                available_columns = [col for col in _dataset_columns(file_name) if col not in excluded_columns]
                 self.column_dropdown.clear()
                 if available_columns:
                     self.column_dropdown.addItems(available_columns)
@@ -347,12 +595,11 @@ class ForestFireApp(QMainWindow):
         province = self.province_dropdown_visualize.currentText()
         visualization_mode = self.visualization_mode.currentText()
         grid_option = "Grid" if self.grid_option_with_grid.isChecked() else "Plain"
-        file_path = self.csv_input.text()
+        file_path = self.viz_csv_input.text()
 
         # Determine the shapefile path
-        base_path = os.path.join(os.path.dirname(__file__), "Data")
         subfolder = "Grid" if grid_option == "Grid" else "Shapefile"
-        shapefile_path = os.path.join(base_path, subfolder, province, f"{province}_{grid_option}.shp")
+        shapefile_path = os.path.join(DATA_DIR, subfolder, province, f"{province}_{grid_option}.shp")
 
         # Validate shapefile existence
         if not os.path.exists(shapefile_path):
@@ -377,37 +624,95 @@ class ForestFireApp(QMainWindow):
         elif visualization_mode == "Advanced (Plotly)":
             self.advanced_visualization(shapefile_path, file_path, selected_column, province)
 
+    def load_merged_data(self, shapefile_path, csv_path, column, simplified=False):
+        """
+        Merge the shapefile (with simplified geometries if requested) with the CSV data,
+        reusing the result while the CSV is unchanged.
+        """
+        key = (shapefile_path, csv_path, os.path.getmtime(csv_path), column, simplified)
+        merged = self.merged_cache.get(key)
+        if merged is None:
+            shapefile = _load_simplified_shapefile(shapefile_path) if simplified else _load_shapefile(shapefile_path)
+            data = _read_dataset(csv_path, columns=['grid_id', column])
+
+            # Gather shapefile rows by position rather than a pandas merge
+            csv_rows, shapefile_rows = _rows_by_grid_id(shapefile, data['grid_id'].to_numpy())
+            merged = shapefile.iloc[shapefile_rows].reset_index(drop=True)
+            merged[column] = data[column].to_numpy()[csv_rows]
+
+            if len(self.merged_cache) >= MERGED_CACHE_SIZE:
+                self.merged_cache.pop(next(iter(self.merged_cache)))
+            self.merged_cache[key] = merged
+        return merged
+
+    def get_plot_figure(self, title):
+        """Clear and return the figure of the reusable Matplotlib window, creating it on first use."""
+        if self.plot_canvas is None:
+            from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+            from matplotlib.figure import Figure
+
+            self.plot_canvas = FigureCanvasQTAgg(Figure(figsize=(12, 10)))
+            self.plot_dialog = QDialog(self)
+            layout = QVBoxLayout()
+            layout.addWidget(self.plot_canvas)
+            self.plot_dialog.setLayout(layout)
+
+        self.plot_dialog.setWindowTitle(title)
+        self.plot_canvas.figure.clf()
+        return self.plot_canvas.figure
+
+    def show_plot_figure(self):
+        """Redraw the Matplotlib window and show it without blocking the event loop."""
+        self.plot_canvas.draw_idle()
+        self.plot_dialog.show()
+        self.plot_dialog.raise_()
+
+    def show_plotly_figure(self, fig, title):
+        """Show a Plotly figure in the reusable web view window (or the browser without PyQtWebEngine)."""
+        if QWebEngineView is None:
+            fig.show()
+            return
+
+        if self.plotly_view is None:
+            self.plotly_view = QWebEngineView()
+            self.plotly_dialog = QDialog(self)
+            layout = QVBoxLayout()
+            layout.addWidget(self.plotly_view)
+            self.plotly_dialog.setLayout(layout)
+            self.plotly_dialog.resize(1000, 800)
+            self.plotly_html_path = os.path.join(tempfile.gettempdir(), f"forest_fire_plot_{os.getpid()}.html")
+
+        # setHtml() is limited to 2 MB, which a province's polygons exceed, so load one reused file instead.
+        # plotly.js is inlined: a local page may not fetch it from the CDN (LocalContentCanAccessRemoteUrls is off)
+        fig.write_html(self.plotly_html_path, include_plotlyjs=True)
+        self.plotly_view.load(QUrl.fromLocalFile(self.plotly_html_path))
+        self.plotly_dialog.setWindowTitle(title)
+        self.plotly_dialog.show()
+        self.plotly_dialog.raise_()
+
     def basic_visualization(self, shapefile_path, csv_path, column, province):
         """Basic visualization using Matplotlib."""
-        import matplotlib.pyplot as plt
-        import geopandas as gpd
-        import pandas as pd
-        from matplotlib.colors import Normalize
-        from matplotlib.colorbar import ColorbarBase
-
         try:
-            # Load data
-            shapefile = gpd.read_file(shapefile_path)
-            data = pd.read_csv(csv_path)
+            # Load and merge shapefile and CSV data (cached), with simplified geometries
+            merged = self.load_merged_data(shapefile_path, csv_path, column, simplified=True)
 
-            # Merge shapefile and CSV data
-            merged = shapefile.merge(data, on='grid_id')
-
-            # Plot using Matplotlib
-            fig, ax = plt.subplots(figsize=(12, 10))
+            # Plot using Matplotlib; the polygons are rasterized rather than kept as vector paths
+            fig = self.get_plot_figure(f"{province} - {column.capitalize()}")
+            ax = fig.add_subplot()
             colormap = "terrain" if column == "elevation" else "viridis"
 
             merged.plot(
                 ax=ax,
                 column=column,
                 cmap=colormap,
+                rasterized=True,
                 legend=True,
                 legend_kwds={'label': f"{column.capitalize()}", 'orientation': "vertical"}
             )
             ax.set_title(f"{province} - {column.capitalize()} Visualization", fontsize=14)
             ax.axis("off")
-            plt.tight_layout()
-            plt.show()
+            fig.tight_layout()
+            self.show_plot_figure()
 
             self.terminal_output.append(f"Basic visualization of '{column}' completed.")
 
@@ -416,30 +721,25 @@ class ForestFireApp(QMainWindow):
 
     def advanced_visualization(self, shapefile_path, csv_path, column, province):
         """Advanced visualization using Plotly."""
-        import geopandas as gpd
-        import pandas as pd
         import plotly.express as px
 
         try:
-            # Load data
-            shapefile = gpd.read_file(shapefile_path)
-            data = pd.read_csv(csv_path)
-
-            # Merge shapefile and CSV data
-            merged = shapefile.merge(data, on='grid_id')
+            # Load and merge shapefile and CSV data (cached)
+            merged = self.load_merged_data(shapefile_path, csv_path, column)
 
             # Plot using Plotly
             fig = px.choropleth(
                 merged,
-                geojson=merged.geometry,
-                locations=merged.index,
+                geojson=_load_geojson(shapefile_path),
+                locations="grid_id",
                 color=column,
                 hover_name="grid_id",
                 color_continuous_scale="terrain" if column == "elevation" else "viridis",
                 title=f"{province} - {column.capitalize()} Heatmap"
             )
             fig.update_geos(fitbounds="locations", visible=False)
-            fig.show()
+            fig.update_traces(marker_line_width=0)
+            self.show_plotly_figure(fig, f"{province} - {column.capitalize()}")
 
             self.terminal_output.append(f"Advanced visualization of '{column}' completed.")
 
@@ -448,17 +748,15 @@ class ForestFireApp(QMainWindow):
 
     def visualize_shapefile_with_matplotlib(self, shapefile_path):
         """Visualize shapefile only using Matplotlib."""
-        import geopandas as gpd
-        import matplotlib.pyplot as plt
-
         try:
-            shapefile_gdf = gpd.read_file(shapefile_path)
+            shapefile_gdf = _load_simplified_shapefile(shapefile_path)
 
             # Plot shapefile
-            fig, ax = plt.subplots(figsize=(10, 8))
-            shapefile_gdf.plot(ax=ax, color="lightgrey", edgecolor="black")
+            fig = self.get_plot_figure("Shapefile Visualization")
+            ax = fig.add_subplot()
+            shapefile_gdf.plot(ax=ax, color="lightgrey", edgecolor="black", rasterized=True)
             ax.set_title("Shapefile Visualization", fontsize=14)
-            plt.show()
+            self.show_plot_figure()
 
             self.terminal_output.append("Shapefile visualization completed using Matplotlib.")
         except Exception as e:
@@ -466,21 +764,20 @@ class ForestFireApp(QMainWindow):
 
     def visualize_shapefile_with_plotly(self, shapefile_path):
         """Visualize shapefile only using Plotly."""
-        import geopandas as gpd
         import plotly.express as px
 
         try:
-            shapefile_gdf = gpd.read_file(shapefile_path)
+            shapefile_gdf = _load_shapefile(shapefile_path)
 
             # Plot shapefile
             fig = px.choropleth(
                 shapefile_gdf,
-                geojson=shapefile_gdf.geometry,
+                geojson=_load_geojson(shapefile_path),
                 locations=shapefile_gdf.index,
                 title="Shapefile Visualization",
             )
             fig.update_geos(fitbounds="locations")
-            fig.show()
+            self.show_plotly_figure(fig, "Shapefile Visualization")
 
             self.terminal_output.append("Shapefile visualization completed using Plotly.")
         except Exception as e:
@@ -488,8 +785,21 @@ class ForestFireApp(QMainWindow):
 
     def clear_terminal(self):
         """Clear the terminal output."""
+        self.terminal_buffer.clear()
         self.terminal_output.clear()
 
+    def queue_terminal_line(self, line):
+        """Buffer a line for the terminal; lines arriving together are appended in one relayout."""
+        self.terminal_buffer.append(line)
+        if not self.terminal_timer.isActive():
+            self.terminal_timer.start()
+
+    def flush_terminal(self):
+        """Append all buffered lines to the terminal at once."""
+        if self.terminal_buffer:
+            self.terminal_output.append("\n".join(self.terminal_buffer))
+            self.terminal_buffer.clear()
+
     def save_credentials(self):
         """Save CDS API credentials to 'Data/credentials/credentials.json'."""
         username = self.username_input.text().strip()
@@ -505,36 +815,19 @@ class ForestFireApp(QMainWindow):
         }
 
         # Ensure the directory exists
-        credentials_dir = "Data/credentials"
-        os.makedirs(credentials_dir, exist_ok=True)
+        os.makedirs(CREDENTIALS_DIR, exist_ok=True)
 
         # Save to JSON file
-        credentials_file = os.path.join(credentials_dir, "credentials.json")
         try:
-            with open(credentials_file, "w") as f:
+            with open(CREDENTIALS_FILE, "w") as f:
                 json.dump(credentials, f, indent=4)
             self.terminal_output.append("✅ Credentials saved successfully.")
         except Exception as e:
             self.terminal_output.append(f"❌ Error saving credentials: {str(e)}")
 
-    def check_class_distribution(self):
-        """Check class distribution from the selected CSV."""
-        file_name = self.class_csv_input.text()
-        if not file_name:
-            QMessageBox.warning(self, "Input Error", "Please select a CSV file for class distribution.")
-            return
-
-        try:
-            df = pd.read_csv(file_name)
-            class_distribution = df['Fire_Occurred'].value_counts()
-            self.terminal_output.append("Class Distribution:")
-            self.terminal_output.append(str(class_distribution))
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to analyze class distribution: {str(e)}")
-       
     def train_model(self):
         """Train ML model using selected CSV and model."""
-        file_name = self.ml_csv_input.text()
+        file_name = self.class_csv_input.text()
         model_type = self.model_dropdown.currentText()
 
         if not file_name:
@@ -542,22 +835,38 @@ class ForestFireApp(QMainWindow):
             return
 
         try:
-            df = pd.read_csv(file_name)
-            X = df.drop('Fire_Occurred', axis=1)
-            y = df['Fire_Occurred']
+            # Only the label and the numeric features (as balance_data uses them), so the
+            # string Date and Fire_Cause columns never reach the models
+            available = _dataset_columns(file_name)
+            if 'Fire_Occurred' not in available:
+                QMessageBox.critical(self, "Missing Column", "The file must contain a 'Fire_Occurred' column.")
+                return
+            columns = [col for col in BALANCE_FEATURES + ['Date', 'Fire_Occurred'] if col in available]
+
+            # pop() moves the label out in place; drop() would copy every feature column
+            X = _read_dataset(file_name, columns=columns)
+            y = X.pop('Fire_Occurred')
+            if 'Date' in X.columns:
+                # Days since 1970-01-01, the same encoding balance_data uses
+                X['Date_Days'] = pd.to_datetime(X.pop('Date')).to_numpy().astype('datetime64[D]').view(np.int64)
+            X = X[[col for col in BALANCE_FEATURES if col in X.columns]].fillna(0)
 
             if model_type == "Logistic Regression":
                 from sklearn.linear_model import LogisticRegression
                 model = LogisticRegression()
             elif model_type == "Random Forest":
                 from sklearn.ensemble import RandomForestClassifier
-                model = RandomForestClassifier()
-            elif model_type == "SVM":
-                from sklearn.svm import SVC
-                model = SVC()
-            elif model_type == "KNN":
-                from sklearn.neighbors import KNeighborsClassifier
-                model = KNeighborsClassifier()
+                # Each tree bootstraps at most RF_MAX_SAMPLES rows, bounding per-tree memory
+                model = RandomForestClassifier(n_jobs=-1, max_samples=min(RF_MAX_SAMPLES, len(X)))
+            elif model_type == "XGBoost":
+                import xgboost as xgb
+                model = xgb.XGBClassifier(tree_method="hist", n_jobs=os.cpu_count())
+            elif model_type == "LightGBM":
+                import lightgbm as lgb
+                model = lgb.LGBMClassifier(n_jobs=os.cpu_count())
+            else:
+                QMessageBox.warning(self, "Invalid Model", f"Model '{model_type}' is not supported.")
+                return
 
             model.fit(X, y)
             self.terminal_output.append(f"Model {model_type} trained successfully.")
@@ -603,34 +912,48 @@ class ForestFireApp(QMainWindow):
             QMessageBox.warning(self, "Input Error", "Please provide Province, Start Date, and End Date.")
             return
 
+        # ✅ Parse both dates once, here, so a typo is reported before any stage starts
+        try:
+            start_dt = datetime.fromisoformat(start_date)
+            end_dt = datetime.fromisoformat(end_date)
+        except ValueError:
+            QMessageBox.warning(self, "Input Error", "Dates must be in YYYY-MM-DD format.")
+            return
+        if start_dt > end_dt:
+            QMessageBox.warning(self, "Input Error", "Start Date must not be after End Date.")
+            return
+        start_date, end_date = start_dt.strftime("%Y-%m-%d"), end_dt.strftime("%Y-%m-%d")
+
         # ✅ Generate Request ID only ONCE
         request_id = datetime.now().strftime("%Y%m%d_%H%M")
+        # Each stage creates its own subfolder (and so this folder) as it starts
         base_output_dir = os.path.join("Output/Requests", f"Request_{request_id}")
-        os.makedirs(base_output_dir, exist_ok=True)  # Ensure request folder exists
 
         self.terminal_output.append(f"📌 Request ID: {request_id}")
         self.terminal_output.append(f"Processing data for {province} from {start_date} to {end_date}...")
 
-        try:
-            # ✅ Pass `base_output_dir` to climate & fire functions
-            process_climate_data(province, start_date, end_date, base_output_dir)
-            self.terminal_output.append("✅ Climate data processing completed.")
-
-            process_fire_history(province, start_date, end_date, base_output_dir)
-            self.terminal_output.append("✅ Fire history processing completed.")
-
-            process_ndvi_data(province, start_date, end_date, base_output_dir)
-            self.terminal_output.append("✅ NDVI data processing completed.")
-
-            process_topo_data(province, base_output_dir)
-            self.terminal_output.append("✅ Topographical data processing completed.")
-
-            # ✅ Merge all datasets
-            merge_final_dataset(request_id, start_date, end_date)
-            self.terminal_output.append(f"✅ Data processing & merging completed. Final dataset saved in: {base_output_dir}")
-
-        except Exception as e:
-            self.terminal_output.append(f"❌ Error: {str(e)}")
+        # ✅ Run the pipeline on a worker thread so the window stays responsive
+        self.run_button.setEnabled(False)
+        self.pipeline_thread = QThread()
+        self.pipeline_worker = PipelineWorker(province, start_date, end_date, request_id, base_output_dir)
+        self.pipeline_worker.moveToThread(self.pipeline_thread)
+
+        self.pipeline_thread.started.connect(self.pipeline_worker.run)
+        self.pipeline_worker.progress.connect(self.queue_terminal_line)
+        self.pipeline_worker.finished.connect(self.pipeline_finished)
+        self.pipeline_worker.finished.connect(self.pipeline_thread.quit)
+        self.pipeline_worker.finished.connect(self.pipeline_worker.deleteLater)
+        self.pipeline_thread.finished.connect(self.pipeline_thread.deleteLater)
+        self.pipeline_thread.finished.connect(lambda: self.run_button.setEnabled(True))
+        self.pipeline_thread.start()
+
+    def pipeline_finished(self, error):
+        """Report the end of a pipeline run (called on the GUI thread)."""
+        self.flush_terminal()
+        if error:
+            QMessageBox.critical(self, "Error", f"Dataset generation failed:\n{error}")
+        else:
+            QMessageBox.information(self, "Done", "Dataset generation completed.")
 
     def execute_steps_with_delay(self, steps, province, start_date):
         """Execute each step with a delay."""
@@ -651,7 +974,7 @@ class ForestFireApp(QMainWindow):
     def check_class_distribution(self):
         """Check class distribution in the selected CSV file."""
         # Get the CSV file path from input
-        file_path = self.csv_input.text()
+        file_path = self.class_csv_input.text()
 
         # Step 1: Check if a file is selected
         if not file_path:
@@ -659,23 +982,23 @@ class ForestFireApp(QMainWindow):
             return
 
         # Step 2: Verify the file extension is .csv
-        if not file_path.endswith(".csv"):
-            QMessageBox.warning(self, "File Error", "The selected file must be a CSV.")
+        if not file_path.lower().endswith((".csv", ".parquet")):
+            QMessageBox.warning(self, "File Error", "The selected file must be a CSV or Parquet file.")
             return
 
         try:
-            # Step 3: Read the CSV file
-            df = pd.read_csv(file_path)
-
-            # Step 4: Check if the 'Fire_Occurred' column exists
-            if 'Fire_Occurred' not in df.columns:
+            # Step 3: Check if the 'Fire_Occurred' column exists
+            if 'Fire_Occurred' not in _dataset_columns(file_path):
                 QMessageBox.critical(self, "Missing Column", "The file must contain a 'Fire_Occurred' column.")
                 return
 
-            # Step 5: Calculate class distribution
-            class_counts = df['Fire_Occurred'].value_counts()
-            num_zeros = class_counts.get(0.0, 0)
-            num_ones = class_counts.get(1.0, 0)
+            # Step 4: Read only the 'Fire_Occurred' column
+            fire_occurred = _read_dataset(file_path, columns=['Fire_Occurred'])['Fire_Occurred']
+
+            # Step 5: Calculate class distribution with a single bincount over the 0/1 labels
+            labels = fire_occurred.dropna().to_numpy().astype(np.intp)
+            class_counts = np.bincount(labels, minlength=2)
+            num_zeros, num_ones = class_counts[0], class_counts[1]
 
             # Step 6: Display the class distribution
             self.terminal_output.append("===================================")
@@ -691,9 +1014,13 @@ class ForestFireApp(QMainWindow):
 
     def balance_data(self):
         """Balance the dataset using the selected technique and sampling ratio."""
+        from imblearn.over_sampling import SMOTE
+        from imblearn.under_sampling import NearMiss, EditedNearestNeighbours
+        from imblearn.combine import SMOTEENN
+        from sklearn.neighbors import NearestNeighbors
 
         # Get file path
-        file_path = self.csv_input.text()
+        file_path = self.class_csv_input.text()
         if not file_path:
             QMessageBox.warning(self, "Input Error", "Please select a CSV file first.")
             return
@@ -703,13 +1030,13 @@ class ForestFireApp(QMainWindow):
         sampling_ratio_value = float(sampling_ratio.strip('%')) / 100
         balance_technique = self.balance_dropdown.currentText()
 
-        if not file_path.endswith('.csv'):
-            QMessageBox.warning(self, "File Error", "The selected file must be a CSV.")
+        if not file_path.lower().endswith((".csv", ".parquet")):
+            QMessageBox.warning(self, "File Error", "The selected file must be a CSV or Parquet file.")
             return
 
         try:
             # Step 1: Load dataset
-            df = pd.read_csv(file_path)
+            df = pd.read_parquet(file_path) if _is_parquet(file_path) else pd.read_csv(file_path)
 
             # Ensure 'Fire_Occurred' column exists
             if 'Fire_Occurred' not in df.columns:
@@ -720,7 +1047,9 @@ class ForestFireApp(QMainWindow):
 
             # Step 2: Handle Date separately
             if 'Date' in df.columns:  # Correct column name
-                df['Date_Ordinal'] = pd.to_datetime(df['Date']).apply(lambda x: x.toordinal())
+                # Days since 1970-01-01: one vectorized cast to day precision (rather than a
+                # toordinal() call per row), then a free reinterpretation as integers
+                df['Date_Days'] = pd.to_datetime(df['Date']).to_numpy().astype('datetime64[D]').view(np.int64)
                 df.drop(columns=['Date'], inplace=True)  # Drop original Date column
 
             # Step 3: Handle categorical and missing values
@@ -730,39 +1059,55 @@ class ForestFireApp(QMainWindow):
             if 'ndvi' in df.columns:
                 df['ndvi'] = pd.to_numeric(df['ndvi'], errors='coerce').fillna(0)  # Convert to numeric
             
-            # Step 4: Prepare features (X) and target (y)
-            X = df.drop(columns=['Fire_Occurred'])
-            y = df['Fire_Occurred']
-
-            # Ensure all features are numeric
-            X = X.select_dtypes(include=[np.number])
+            # Step 4: Prepare features (X) and target (y) as arrays, in float32 (ample
+            # precision for these measurements) to halve the memory and distance-computation
+            # bandwidth; integer columns are restored after resampling
+            features = [col for col in BALANCE_FEATURES if col in df.columns]
+            integer_dtypes = {col: df[col].dtype for col in features if pd.api.types.is_integer_dtype(df[col])}
+            X = df[features].to_numpy(dtype=np.float32)
+            y = df['Fire_Occurred'].to_numpy(dtype=np.int8)
 
             # Step 5: Apply balancing technique
+            # The k-NN searches dominate resampling time, so run them on all cores with a
+            # KD-tree (the feature count is small). Neighbour counts are the defaults plus
+            # the query point itself: 5 for SMOTE, 3 for ENN.
+            smote_nn = NearestNeighbors(n_neighbors=6, algorithm='kd_tree', n_jobs=-1)
+            enn_nn = NearestNeighbors(n_neighbors=4, algorithm='kd_tree', n_jobs=-1)
             if balance_technique == "SMOTE":
-                resampler = SMOTE(sampling_strategy=sampling_ratio_value, random_state=42)
+                resampler = SMOTE(sampling_strategy=sampling_ratio_value, k_neighbors=smote_nn, random_state=42)
             elif balance_technique == "NearMiss-3":
-                resampler = NearMiss(version=3)
+                resampler = NearMiss(version=3, n_jobs=-1)
             elif balance_technique == "SMOTE+ENN":
-                resampler = SMOTEENN(sampling_strategy=sampling_ratio_value, random_state=42)
+                resampler = SMOTEENN(
+                    smote=SMOTE(sampling_strategy=sampling_ratio_value, k_neighbors=smote_nn, random_state=42),
+                    enn=EditedNearestNeighbours(sampling_strategy="all", n_neighbors=enn_nn, n_jobs=-1),
+                    random_state=42
+                )
             else:
                 QMessageBox.warning(self, "Invalid Technique", "Selected balancing technique is not supported.")
                 return
 
             # Resample the dataset
             X_resampled, y_resampled = resampler.fit_resample(X, y)
+            X_resampled = pd.DataFrame(X_resampled, columns=features).astype(integer_dtypes)
 
             # Step 6: Restore Date column if applicable
-            if 'Date_Ordinal' in df.columns:
-                X_resampled['Date'] = X_resampled['Date_Ordinal'].apply(lambda x: pd.Timestamp.fromordinal(int(x)))
-                X_resampled.drop(columns=['Date_Ordinal'], inplace=True)
+            if 'Date_Days' in df.columns:
+                # Synthetic samples interpolate the day count; truncate back to whole days
+                X_resampled['Date'] = X_resampled['Date_Days'].to_numpy().astype(np.int64).view('datetime64[D]')
+                X_resampled.drop(columns=['Date_Days'], inplace=True)
 
             # Combine resampled features and target
-            balanced_df = X_resampled.copy()
+            balanced_df = X_resampled
             balanced_df['Fire_Occurred'] = y_resampled
 
             # Step 7: Save the balanced dataset
-            output_path = file_path.replace(".csv", "_balanced.csv")
-            balanced_df.to_csv(output_path, index=False)
+            output_path = f"{os.path.splitext(file_path)[0]}_balanced.{BALANCED_OUTPUT_FORMAT}"
+            if BALANCED_OUTPUT_FORMAT == "csv":
+                balanced_df.to_csv(output_path, index=False)
+            else:
+                balanced_df.to_parquet(output_path, index=False, engine="pyarrow", compression="zstd",
+                                       compression_level=3, row_group_size=100_000)
 
             self.terminal_output.append("===================================")
             self.terminal_output.append("DATASET BALANCED SUCCESSFULLY")
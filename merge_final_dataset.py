@@ -1,10 +1,87 @@
 import os
+import logging
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.fs as fs
 
-def merge_final_dataset(request_id, start_date, end_date, base_output_dir="Output/Requests"):
+logger = logging.getLogger(__name__)
+
+def date_filter(schema, start_date, end_date):
+    """
+    Builds a pyarrow dataset filter keeping rows with start_date <= Date <= end_date.
+
+    Args:
+        schema (pyarrow.Schema): Schema of the dataset being read.
+        start_date (str): Start date in YYYY-MM-DD format.
+        end_date (str): End date in YYYY-MM-DD format.
+
+    Returns:
+        pyarrow.dataset.Expression or None: The filter, or None if there is no usable date column.
+    """
+    date_column = next((name for name in ("Date", "date") if name in schema.names), None)
+    if date_column is None:
+        return None
+
+    date_type = schema.field(date_column).type
+    bounds = [pd.Timestamp(start_date), pd.Timestamp(end_date)]
+    if pa.types.is_string(date_type) or pa.types.is_large_string(date_type):
+        # ISO dates compare correctly as strings
+        low, high = (pa.scalar(bound.strftime("%Y-%m-%d"), type=date_type) for bound in bounds)
+    elif pa.types.is_temporal(date_type):
+        low, high = (pa.scalar(bound.to_pydatetime()).cast(date_type) for bound in bounds)
+    else:
+        return None
+
+    field = ds.field(date_column)
+    return (field >= low) & (field <= high)
+
+def load_dataset(path, start_date=None, end_date=None):
+    """
+    Loads one input dataset, preferring Feather or Parquet over the CSV path when a copy exists.
+    When a date range is given, rows outside it are skipped while reading.
+
+    Args:
+        path (str): Path of the dataset's CSV file.
+        start_date (str): Optional start date in YYYY-MM-DD format.
+        end_date (str): Optional end date in YYYY-MM-DD format.
+
+    Returns:
+        (str, DataFrame): The file actually read and its data, or (None, None) if neither exists.
+    """
+    stem = os.path.splitext(path)[0]
+    # An Arrow IPC (Feather) file, a single Parquet file, a (year/month) partitioned
+    # Parquet directory, or the CSV
+    candidates = ((stem + ".feather", "ipc"), (stem + ".parquet", "parquet"), (stem, "parquet"), (path, "csv"))
+    for source, file_format in candidates:
+        if os.path.exists(source):
+            break
+    else:
+        return None, None
+
+    if file_format == "csv":
+        # Read whole: a CSV dataset infers column types from its first block only, so a
+        # column that is empty there (NaN ndvi, blank fire dates) fails to convert later on
+        table = pa_csv.read_csv(source)
+        if start_date is not None and end_date is not None:
+            row_filter = date_filter(table.schema, start_date, end_date)
+            if row_filter is not None:
+                table = table.filter(row_filter)
+        return source, table.to_pandas()
+
+    # Memory-mapped reads let uncompressed Feather files be served from the page cache
+    dataset = ds.dataset(source, format=file_format, partitioning="hive",
+                         filesystem=fs.LocalFileSystem(use_mmap=True))
+    row_filter = None
+    if start_date is not None and end_date is not None:
+        row_filter = date_filter(dataset.schema, start_date, end_date)
+    return source, dataset.to_table(filter=row_filter).to_pandas()
+
+def merge_final_dataset(request_id, start_date, end_date, base_output_dir="Output/Requests", output_format="parquet"):
     """
-    Merges climate, fire history, NDVI, and topo datasets into a single CSV file.
+    Merges climate, fire history, NDVI, and topo datasets into a single dataset file.
     Filters the final dataset to include only rows within the given date range.
 
     Args:
@@ -12,9 +89,10 @@ def merge_final_dataset(request_id, start_date, end_date, base_output_dir="Outpu
         start_date (str): Start date in YYYY-MM-DD format.
         end_date (str): End date in YYYY-MM-DD format.
         base_output_dir (str): Base directory for storing output files.
+        output_format (str): "parquet" (zstd-compressed, typed) or "csv".
 
     Output:
-        Saves a final merged CSV inside the request folder.
+        Saves the final merged dataset inside the request folder.
     """
 
     # ✅ Define paths for each dataset
@@ -25,20 +103,21 @@ def merge_final_dataset(request_id, start_date, end_date, base_output_dir="Outpu
     ndvi_file = os.path.join(request_dir, "NDVI", "interpolated_ndvi.csv")
     topo_file = os.path.join(request_dir, "Topography", "processed_topo.csv")
     
-    output_file = os.path.join(request_dir, "final_merged_dataset.csv")
+    output_file = os.path.join(request_dir, f"final_merged_dataset.{output_format}")
 
-    # ✅ Load datasets (Check if they exist)
+    # ✅ Load datasets (Check if they exist), reading only rows within the date range
     datasets = {}
     for name, path in {"climate": climate_file, "fire": fire_file, "ndvi": ndvi_file, "topo": topo_file}.items():
-        if os.path.exists(path):
-            datasets[name] = pd.read_csv(path)
-            print(f"✅ Loaded {name} data: {path}")
+        loaded_path, df = load_dataset(path, start_date, end_date)
+        if df is not None:
+            datasets[name] = df
+            logger.info(f"✅ Loaded {name} data: {loaded_path}")
         else:
-            print(f"⚠️ WARNING: {name} data file not found: {path}")
+            logger.warning(f"⚠️ WARNING: {name} data file not found: {path}")
 
     # ❌ If climate dataset is missing, stop merging
     if "climate" not in datasets:
-        print("❌ ERROR: Climate dataset is missing. Merging cannot proceed.")
+        logger.error("❌ ERROR: Climate dataset is missing. Merging cannot proceed.")
         return
 
     # ✅ Start with Climate Data as the base
@@ -50,12 +129,15 @@ def merge_final_dataset(request_id, start_date, end_date, base_output_dir="Outpu
 
     # 🔥 Ensure 'Date' column exists in Climate Data
     if "Date" not in merged_df.columns:
-        print("❌ ERROR: Climate data is missing the 'Date' column!")
+        logger.error("❌ ERROR: Climate data is missing the 'Date' column!")
         return
 
     # ✅ Convert 'Date' column to datetime for filtering
     merged_df["Date"] = pd.to_datetime(merged_df["Date"])
 
+    # ✅ Index on the join keys once, sorted, so the merges below are index joins
+    merged_df = merged_df.set_index(["grid_id", "Date"]).sort_index()
+
     # 🔥 Merge Fire History Data (on grid_id & Date)
     if "fire" in datasets:
         fire_df = datasets["fire"]
@@ -70,26 +152,21 @@ def merge_final_dataset(request_id, start_date, end_date, base_output_dir="Outpu
         fire_df["Total_Fire_Size"] = fire_df.groupby(["grid_id", "Date"])["Fire_Size_HA"].transform("sum")
 
         # ✅ Compute `Fire_Occurred`: 1 if fire exists, 0 otherwise
-        fire_df["Fire_Occurred"] = fire_df["Fire_Size_HA"].apply(lambda x: 1 if x > 0 else 0)
+        fire_df["Fire_Occurred"] = (fire_df["Fire_Size_HA"].to_numpy() > 0).astype(int)
 
         # ✅ Drop duplicate rows (keep one row per `grid_id`, `Date`)
         fire_df = fire_df.drop_duplicates(subset=["grid_id", "Date"]).copy()
 
-        merged_df = merged_df.merge(
-            fire_df[["grid_id", "Date", "Fire_Cause", "Total_Fire_Size", "Fire_Occurred"]],
-            on=["grid_id", "Date"], how="left"
-        )
-
-        # ✅ Fill missing Fire History values
-        merged_df["Total_Fire_Size"].fillna(0, inplace=True)  # No fire, size = 0
-        merged_df["Fire_Occurred"].fillna(0, inplace=True)  # No fire = 0
-        merged_df["Fire_Cause"].fillna("None", inplace=True)  # No fire cause = None
+        # ✅ Store the few distinct causes as a categorical (with "None" for no-fire rows)
+        fire_causes = fire_df["Fire_Cause"].astype("category")
+        if "None" not in fire_causes.cat.categories:
+            fire_causes = fire_causes.cat.add_categories("None")
+        fire_df["Fire_Cause"] = fire_causes
 
-    else:
-        # If fire data is missing, create placeholder columns
-        merged_df["Total_Fire_Size"] = 0
-        merged_df["Fire_Occurred"] = 0
-        merged_df["Fire_Cause"] = "None"
+        fire_df = fire_df.set_index(["grid_id", "Date"]).sort_index()
+        merged_df = merged_df.join(
+            fire_df[["Fire_Cause", "Total_Fire_Size", "Fire_Occurred"]], how="left"
+        )
 
     # 🌿 Merge NDVI Data (on grid_id & Date)
     if "ndvi" in datasets:
@@ -101,30 +178,23 @@ def merge_final_dataset(request_id, start_date, end_date, base_output_dir="Outpu
 
         ndvi_df["Date"] = pd.to_datetime(ndvi_df["Date"])
 
-        merged_df = merged_df.merge(
-            ndvi_df, on=["grid_id", "Date"], how="left"
-        )
-        merged_df["ndvi"].fillna(np.nan, inplace=True)  # Missing NDVI = NaN
-    else:
-        merged_df["ndvi"] = np.nan
+        ndvi_df = ndvi_df.set_index(["grid_id", "Date"]).sort_index()
+        merged_df = merged_df.join(ndvi_df, how="left")  # Missing NDVI stays NaN
 
     # 🏔 Merge Topo Data (Only on grid_id, NOT Date)
     if "topo" in datasets:
-        merged_df = merged_df.merge(
-            datasets["topo"], on="grid_id", how="left"
-        )
-        merged_df["Elevation"].fillna(np.nan, inplace=True)
-        merged_df["Slope"].fillna(np.nan, inplace=True)
-        merged_df["Aspect"].fillna(np.nan, inplace=True)
-    else:
-        merged_df["Elevation"] = np.nan
-        merged_df["Slope"] = np.nan
-        merged_df["Aspect"] = np.nan
+        # Cell coordinates already come from the climate data
+        topo_df = datasets["topo"].drop(columns=["Latitude", "Longitude"], errors="ignore")
+        topo_df = topo_df.set_index("grid_id").sort_index()
+        merged_df = merged_df.join(topo_df, on="grid_id", how="left")  # Missing topo stays NaN
+
+    merged_df = merged_df.reset_index()
 
     # ✅ Filter dataset to only include rows within the given date range
-    start_date = pd.to_datetime(start_date)
-    end_date = pd.to_datetime(end_date)
-    merged_df = merged_df[(merged_df["Date"] >= start_date) & (merged_df["Date"] <= end_date)]
+    # (compared on the raw datetime64 array, skipping pandas' Series comparison machinery)
+    dates = merged_df["Date"].to_numpy()
+    in_range = (dates >= np.datetime64(start_date)) & (dates <= np.datetime64(end_date))
+    merged_df = merged_df.iloc[np.flatnonzero(in_range)]
 
     # ✅ Final Column Reordering
     column_order = [
@@ -135,9 +205,21 @@ def merge_final_dataset(request_id, start_date, end_date, base_output_dir="Outpu
         "Elevation", "Slope", "Aspect"
     ]
 
-    # 🛠️ Ensure only existing columns are included
-    merged_df = merged_df[[col for col in column_order if col in merged_df.columns]]
+    # 🛠️ Keep the existing columns, adding any from missing datasets, then fill the gaps
+    # in one pass (no fire: size 0, not occurred, cause None; missing NDVI/topo stay NaN)
+    fill_values = {"Total_Fire_Size": 0, "Fire_Occurred": 0, "Fire_Cause": "None"}
+    placeholder_columns = {"Total_Fire_Size", "Fire_Occurred", "Fire_Cause", "ndvi", "Elevation", "Slope", "Aspect"}
+    merged_df = merged_df.reindex(columns=[col for col in column_order if col in merged_df.columns or col in placeholder_columns])
+    merged_df = merged_df.fillna(fill_values)
+    merged_df["Fire_Cause"] = merged_df["Fire_Cause"].astype("category")
 
     # ✅ Save Final Dataset
-    merged_df.to_csv(output_file, index=False)
-    print(f"✅ Final merged dataset saved: {output_file}")
+    if output_format == "csv":
+        # Arrow's native (multi-threaded) CSV writer; dates written as plain YYYY-MM-DD
+        table = pa.Table.from_pandas(merged_df, preserve_index=False)
+        date_index = table.schema.get_field_index("Date")
+        table = table.set_column(date_index, "Date", table.column("Date").cast(pa.date32()))
+        pa_csv.write_csv(table, output_file, pa_csv.WriteOptions(quoting_style="needed"))
+    else:
+        merged_df.to_parquet(output_file, index=False, compression="zstd")
+    logger.info(f"✅ Final merged dataset saved: {output_file}")
@@ -1,30 +1,37 @@
 import pandas as pd
 import numpy as np
 
-# Load dataset
-data = pd.read_csv("/Users/dheemanth/Desktop/Forest Fire Dataset Generation tool/App/final.csv")
+input_file = "/Users/dheemanth/Desktop/Forest Fire Dataset Generation tool/App/final.csv"
+output_file = "preprocessed_dataset_no_fire_cause.csv"
 
-# Fill missing values in fire_occurred with 0.0
-data['fire_occurred'] = data['fire_occurred'].fillna(0.0)
+# Rows per chunk; memory use stays constant however large the input grows
+chunk_size = 500_000
 
-# Fill missing values in meteorological and geographical features with 0.0
+# Meteorological and geographical features whose missing values become 0.0
 features_to_fill = [
     'mean_dew_point_temperature', 'mean_soil_water_top_layer',
     'mean_solar_radiation', 'mean_temperature_2m',
     'mean_total_precipitation', 'mean_wind_speed_u', 'mean_wind_speed_v',
     'elevation', 'slope', 'aspect', 'ndvi'
 ]
-data[features_to_fill] = data[features_to_fill].fillna(0.0)
 
-# Fill missing fire_size with 0.0
-data['fire_size'] = data['fire_size'].fillna(0.0)
+# Read numeric columns as float32 to halve each chunk's footprint
+column_dtypes = {column: 'float32' for column in features_to_fill + ['fire_occurred', 'fire_size']}
 
-# Drop the problematic fire_cause column
-if 'fire_cause' in data.columns:
-    data = data.drop('fire_cause', axis=1)
+# Load dataset in chunks and write each one out as it is cleaned. The problematic
+# fire_cause column is left out of this dataset, so it is never parsed at all
+reader = pd.read_csv(input_file, chunksize=chunk_size, dtype=column_dtypes,
+                     usecols=lambda column: column != 'fire_cause')
+with open(output_file, "w", newline="") as f:
+    for i, chunk in enumerate(reader):
+        # Fill missing values in meteorological and geographical features with 0.0
+        chunk[features_to_fill] = chunk[features_to_fill].fillna(0.0)
 
-# Ensure fire_occurred is an integer
-data['fire_occurred'] = data['fire_occurred'].astype(int)
+        # Fill missing fire_size with 0.0
+        chunk['fire_size'] = chunk['fire_size'].fillna(0.0)
 
-# Save the preprocessed dataset
-data.to_csv("preprocessed_dataset_no_fire_cause.csv", index=False)
+        # Fill missing values in fire_occurred with 0 and ensure it is an integer
+        chunk['fire_occurred'] = chunk['fire_occurred'].fillna(0).astype(np.int8)
+
+        # Save the preprocessed chunk (header only once)
+        chunk.to_csv(f, index=False, header=(i == 0))
@@ -1,14 +1,123 @@
 import os
+import logging
 import cdsapi
 import numpy as np
 import geopandas as gpd
 import pandas as pd
 import xarray as xr
+import io
 import zipfile
-import shutil
-import glob
-from shapely.geometry import Point
-from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from scipy.spatial import cKDTree
+import grid_cache
+
+logger = logging.getLogger(__name__)
+
+# Concurrent CDS downloads; CDS queues anything beyond its per-user limit
+CDS_MAX_CONCURRENT_REQUESTS = 4
+
+# Climate variables averaged per grid cell and day, in output order
+CLIMATE_COLUMNS = [
+    'Wind_Speed_U_10m', 'Wind_Speed_V_10m', 'Dew_Point_2m_C',
+    'Temperature_2m_C', 'Surface_Pressure_Pa', 'Total_Precip_mm',
+]
+
+@lru_cache(maxsize=4)
+def _load_grid(shapefile_path, mtime):
+    grid_gdf = grid_cache.load_grid(shapefile_path)
+    projected_centroids = gpd.GeoSeries(gpd.points_from_xy(grid_gdf['Longitude'], grid_gdf['Latitude']),
+                                        crs="EPSG:4326").to_crs("EPSG:3857")
+    centroid_tree = cKDTree(np.column_stack([projected_centroids.x, projected_centroids.y]))
+    return grid_gdf, centroid_tree
+
+def load_grid(shapefile_path):
+    """
+    Load a grid shapefile in EPSG:4326 (see grid_cache.load_grid), plus a KD-tree
+    over its cell centres in EPSG:3857. Cached per file modification time, so
+    repeated requests reuse the grid; callers must not modify it.
+
+    Args:
+        shapefile_path (str): Path to the grid shapefile.
+
+    Returns:
+        (GeoDataFrame, cKDTree): The grid and its centroid tree.
+    """
+    return _load_grid(shapefile_path, os.path.getmtime(shapefile_path))
+
+def netcdf_to_dataframe(nc_file):
+    """
+    Flatten a NetCDF file into one row per grid point and time step.
+
+    Builds the columns straight from the variable arrays (kept in their stored
+    dtype, float32 for ERA5, and not copied) instead of pivoting through
+    to_dataframe().
+
+    Args:
+        nc_file (str or file-like): Path to the NetCDF file, or its bytes in a buffer.
+
+    Returns:
+        DataFrame: One column per dimension coordinate and per data variable.
+    """
+    with xr.open_dataset(nc_file, engine="h5netcdf") as ds:
+        # Gridded fields; lower-dimensional extras (e.g. expver flags) are skipped
+        dims = max((var.dims for var in ds.data_vars.values()), key=len)
+        variables = [name for name, var in ds.data_vars.items() if set(var.dims) == set(dims)]
+        shape = tuple(ds.sizes[dim] for dim in dims)
+
+        columns = {}
+        for axis, dim in enumerate(dims):
+            # Coordinate values repeated to match the C-order flattening below
+            repeat = int(np.prod(shape[axis + 1:]))
+            tile = int(np.prod(shape[:axis]))
+            columns[dim] = np.tile(np.repeat(ds[dim].values, repeat), tile)
+        for name in variables:
+            columns[name] = ds[name].transpose(*dims).values.reshape(-1)
+    # Wrap the arrays as they are rather than consolidating them into a second copy
+    return pd.DataFrame(columns, copy=False)
+
+def grouped_mean(values, group_idx, n_groups):
+    """
+    Mean of the non-NaN values in each group, as groupby().mean() gives it.
+
+    Args:
+        values (ndarray): Values to average.
+        group_idx (ndarray): Group number 0..n_groups-1 of each value.
+        n_groups (int): Number of groups.
+
+    Returns:
+        ndarray: float64 mean per group, NaN where a group has no values.
+    """
+    valid = ~np.isnan(values)
+    counts = np.bincount(group_idx[valid], minlength=n_groups)
+    sums = np.bincount(group_idx[valid], weights=values[valid], minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+def assign_points_to_grid(points, projected_points, grid_gdf, centroid_tree):
+    """
+    Find the grid cell containing each point.
+
+    The nearest cell centroid (from a KD-tree over projected centroids) is
+    tried first; points it does not contain fall back to a spatial-index query.
+
+    Args:
+        points (GeoSeries): Points in the grid's CRS.
+        projected_points (GeoSeries): The same points in the centroid tree's CRS.
+        grid_gdf (GeoDataFrame): Grid cells.
+        centroid_tree (cKDTree): KD-tree over the projected grid cell centroids.
+
+    Returns:
+        ndarray: Row position in grid_gdf for each point, -1 where no cell contains it.
+    """
+    _, nearest = centroid_tree.query(np.column_stack([projected_points.x, projected_points.y]))
+    cell_idx = np.where(grid_gdf.geometry.values[nearest].contains(points.values), nearest, -1)
+
+    missed = np.flatnonzero(cell_idx < 0)
+    if len(missed):
+        point_idx, grid_idx = grid_gdf.sindex.query(points.values[missed], predicate="within")
+        cell_idx[missed[point_idx]] = grid_idx
+    return cell_idx
 
 def process_climate_data(province, start_date, end_date, base_output_dir):
     """
@@ -16,9 +125,10 @@ def process_climate_data(province, start_date, end_date, base_output_dir):
     
     Steps:
     1. Get bounding box from province shapefile.
-    2. Fetch climate data from CDS API.
-    3. Extract NetCDF from ZIP and convert to CSV.
+    2. Fetch climate data from CDS API, one request per month in the range.
+    3. Read NetCDF from ZIP and flatten it into a DataFrame.
     4. Map and aggregate climate data to grid.
+    5. Concatenate the months into a single Feather file.
     
     Args:
         province (str): Name of the province.
@@ -33,87 +143,71 @@ def process_climate_data(province, start_date, end_date, base_output_dir):
     if not os.path.exists(shapefile_path):
         raise FileNotFoundError(f"Shapefile not found: {shapefile_path}")
 
-    def get_bounding_box_cds(shapefile_path):
-        gdf = gpd.read_file(shapefile_path)
-        if gdf.crs is None or gdf.crs.to_epsg() != 4326:
-            gdf = gdf.to_crs("EPSG:4326")
-        bounds = gdf.total_bounds
+    grid_gdf, centroid_tree = load_grid(shapefile_path)
+
+    def get_bounding_box_cds(grid_gdf):
+        bounds = grid_gdf.total_bounds
         return [bounds[3], bounds[0], bounds[1], bounds[2]]  # [North, West, South, East]
 
-    bbox_cds = get_bounding_box_cds(shapefile_path)
-    print(f"CDS Bounding Box for {province}: {bbox_cds}")
+    bbox_cds = get_bounding_box_cds(grid_gdf)
+    logger.info(f"CDS Bounding Box for {province}: {bbox_cds}")
 
     # 2️⃣ **Prepare Request ID & Output Paths**
     request_dir = os.path.join(base_output_dir, "Climate")
     os.makedirs(request_dir, exist_ok=True)
 
-    zip_file = os.path.join(request_dir, "climate_data.zip")
-    nc_file = os.path.join(request_dir, "climate_data.nc")
-    csv_file = os.path.join(request_dir, "climate_data.csv")
-    output_csv = os.path.join(request_dir, "aggregated_climate_data.csv")
-
-    # 3️⃣ **Fetch Climate Data**
-    c = cdsapi.Client()
-
-    request_params = {
-        'product_type': 'reanalysis',
-        "data_format": "netcdf",
-        "download_format": "zip",
-        'variable': [
-            "10m_u_component_of_wind",
-            "10m_v_component_of_wind",
-            "2m_dewpoint_temperature",
-            "2m_temperature",
-            "surface_pressure",
-            "total_precipitation",
-        ],
-        'year': start_date[:4],  # Extract year from start_date
-        'month': start_date[5:7],  # Extract month
-        'day': [f"{day:02d}" for day in range(1, 32)],
-        'time': '12:00',
-        'area': [np.float64(coord) for coord in bbox_cds],  # North, West, South, East
-    }
-
-    print("Fetching climate data from CDS API...")
-    c.retrieve('reanalysis-era5-land', request_params, zip_file)
-    print(f"✅ Data downloaded successfully: {zip_file}")
-
-    # 4️⃣ **Extract & Convert NetCDF to CSV**
-    def process_zip(zip_file, output_csv):
-        temp_dir = os.path.join(request_dir, "temp_extracted")
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-        os.makedirs(temp_dir)
+    # Uncompressed Arrow IPC (Feather), which the merge step memory-maps instead of parsing
+    output_file = os.path.join(request_dir, "aggregated_climate_data.feather")
 
-        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
+    # 3️⃣ **Fetch Climate Data** (one CDS request per month)
+    def fetch_month(c, year, month, days, zip_file):
+        request_params = {
+            'product_type': 'reanalysis',
+            "data_format": "netcdf",
+            "download_format": "zip",
+            'variable': [
+                "10m_u_component_of_wind",
+                "10m_v_component_of_wind",
+                "2m_dewpoint_temperature",
+                "2m_temperature",
+                "surface_pressure",
+                "total_precipitation",
+            ],
+            'year': year,
+            'month': month,
+            'day': days,
+            'time': '12:00',
+            'area': [np.float64(coord) for coord in bbox_cds],  # North, West, South, East
+        }
 
-        nc_files = glob.glob(os.path.join(temp_dir, "*.nc"))
-        if not nc_files:
-            raise FileNotFoundError("No NetCDF (.nc) files found in the ZIP archive.")
+        logger.info(f"Fetching {year}-{month} climate data from CDS API...")
+        c.retrieve('reanalysis-era5-land', request_params, zip_file)
+        logger.info(f"✅ Data downloaded successfully: {zip_file}")
 
-        extracted_nc_file = nc_files[0]
-        print(f"Found NetCDF file: {extracted_nc_file}")
+    # 4️⃣ **Read the NetCDF from the ZIP & Convert It to a DataFrame**
+    def process_zip(zip_file):
+        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+            nc_files = [name for name in zip_ref.namelist() if name.endswith(".nc")]
+            if not nc_files:
+                raise FileNotFoundError("No NetCDF (.nc) files found in the ZIP archive.")
 
-        def convert_nc_to_csv(nc_file, csv_file):
-            ds = xr.open_dataset(nc_file)
-            data = ds.to_dataframe().reset_index()
-            data.to_csv(csv_file, index=False)
-            print(f"Conversion completed: {csv_file}")
+            nc_name = nc_files[0]
+            logger.info(f"Found NetCDF file: {nc_name}")
 
-        convert_nc_to_csv(extracted_nc_file, output_csv)
-        shutil.rmtree(temp_dir)  # Cleanup
+            # h5netcdf opens in-memory files, so nothing is extracted to disk
+            nc_bytes = io.BytesIO(zip_ref.read(nc_name))
 
-    process_zip(zip_file, csv_file)
+        data = netcdf_to_dataframe(nc_bytes)
+        logger.info(f"Conversion completed: {len(data)} rows")
+        return data
 
     # 5️⃣ **Map & Aggregate Data to Grid**
-    def map_and_aggregate_points_to_grid(csv_file, shapefile_path, output_csv):
-        df = pd.read_csv(csv_file)
-
+    def map_and_aggregate_points_to_grid(df, grid_gdf, centroid_tree):
         if 'latitude' not in df.columns or 'longitude' not in df.columns or 'valid_time' not in df.columns:
-            raise ValueError("CSV must contain 'latitude', 'longitude', and 'valid_time' columns")
+            raise ValueError("Climate data must contain 'latitude', 'longitude', and 'valid_time' columns")
 
-        df['valid_time'] = pd.to_datetime(df['valid_time']).dt.date
+        # Midnight timestamps rather than date objects, so grouping hashes int64 values
+        df['valid_time'] = pd.to_datetime(df['valid_time']).dt.normalize()
 
         df = df.rename(columns={
             'valid_time': 'Date',
@@ -125,45 +219,64 @@ def process_climate_data(province, start_date, end_date, base_output_dir):
             'sp': 'Surface_Pressure_Pa'
         })
 
-        df['geometry'] = df.apply(lambda row: Point(row['longitude'], row['latitude']), axis=1)
-        points_gdf = gpd.GeoDataFrame(df, geometry='geometry', crs="EPSG:4326")
+        # The same points repeat at every time step, so locate each distinct one once
+        unique_coords, point_rows = np.unique(df[['longitude', 'latitude']].to_numpy(), axis=0, return_inverse=True)
+        points = gpd.GeoSeries(gpd.points_from_xy(unique_coords[:, 0], unique_coords[:, 1]), crs="EPSG:4326")
+        cell_idx = assign_points_to_grid(points, points.to_crs("EPSG:3857"), grid_gdf, centroid_tree)
+        cell_idx = cell_idx[point_rows.reshape(-1)]
 
-        grid_gdf = gpd.read_file(shapefile_path)
-        if grid_gdf.crs is None or grid_gdf.crs.to_epsg() != 4326:
-            grid_gdf = grid_gdf.to_crs("EPSG:4326")
+        inside = np.flatnonzero(cell_idx >= 0)
 
-        projected_gdf = grid_gdf.to_crs("EPSG:3857")
-        projected_gdf['centroid'] = projected_gdf.geometry.centroid
-        grid_gdf['centroid'] = projected_gdf['centroid'].to_crs("EPSG:4326")
+        # One integer key per (grid cell, date), so each mean is a single bincount pass
+        date_codes, dates = pd.factorize(df['Date'].to_numpy()[inside])
+        keys, group_idx = np.unique(cell_idx[inside] * len(dates) + date_codes, return_inverse=True)
+        group_cells, group_dates = np.divmod(keys, len(dates))
 
-        mapped_gdf = gpd.sjoin(points_gdf, grid_gdf, how="inner", predicate="within")
-
-        mapped_gdf = mapped_gdf.rename(columns={'grid_id': 'GridID'})
-        mapped_gdf = mapped_gdf.drop(columns=['index_right'], errors='ignore')
+        aggregated_gdf = pd.DataFrame({
+            'GridID': grid_gdf['grid_id'].to_numpy()[group_cells],
+            'Date': dates[group_dates],
+        })
+        for column in CLIMATE_COLUMNS:
+            values = df[column].to_numpy()[inside]
+            aggregated_gdf[column] = grouped_mean(values, group_idx, len(keys)).astype(values.dtype)
 
-        aggregated_gdf = mapped_gdf.groupby(['GridID', 'Date']).agg({
-            'Wind_Speed_U_10m': 'mean',
-            'Wind_Speed_V_10m': 'mean',
-            'Dew_Point_2m_C': 'mean',
-            'Temperature_2m_C': 'mean',
-            'Surface_Pressure_Pa': 'mean',
-            'Total_Precip_mm': 'mean'
-        }).reset_index()
+        # Cell centres by position, rather than merging them in on grid_id
+        aggregated_gdf['Latitude'] = grid_gdf['Latitude'].to_numpy()[group_cells]
+        aggregated_gdf['Longitude'] = grid_gdf['Longitude'].to_numpy()[group_cells]
 
-        centroids = grid_gdf[['grid_id', 'centroid']]
-        aggregated_gdf = pd.merge(aggregated_gdf, centroids, left_on='GridID', right_on='grid_id')
-        aggregated_gdf = aggregated_gdf.drop(columns=['grid_id'])
+        return aggregated_gdf
 
-        aggregated_gdf['Latitude'] = aggregated_gdf['centroid'].apply(lambda point: point.y)
-        aggregated_gdf['Longitude'] = aggregated_gdf['centroid'].apply(lambda point: point.x)
-        aggregated_gdf = aggregated_gdf.drop(columns=['centroid'])
+    # 6️⃣ **Process Each Month, Then Write Once**
+    # Downloads mostly wait on the CDS queue, so several months are fetched at once
+    # (within CDS's per-user limit); each month is processed as soon as it arrives,
+    # whichever finishes first, and the months are put back in order at the end
+    monthly_frames = {}
+    with ThreadPoolExecutor(max_workers=CDS_MAX_CONCURRENT_REQUESTS) as executor:
+        downloads = {}
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        for i, period in enumerate(pd.period_range(start, end, freq="M")):
+            year, month = f"{period.year}", f"{period.month:02d}"
+            # Only the days inside the range: a partial first or last month is not
+            # downloaded (and mapped) in full
+            first = max(start, period.start_time).day
+            last = min(end, period.end_time).day
+            days = [f"{day:02d}" for day in range(first, last + 1)]
+            # Month-specific file names, so no month overwrites another's files
+            zip_file = os.path.join(request_dir, f"climate_data_{year}_{month}.zip")
+            future = executor.submit(fetch_month, cdsapi.Client(), year, month, days, zip_file)
+            downloads[future] = (i, zip_file)
 
-        aggregated_gdf.to_csv(output_csv, index=False)
-        print(f"✅ Final output saved: {output_csv}")
+        for future in as_completed(downloads):
+            future.result()
+            i, zip_file = downloads[future]
+            climate_df = process_zip(zip_file)
+            monthly_frames[i] = map_and_aggregate_points_to_grid(climate_df, grid_gdf, centroid_tree)
 
-    map_and_aggregate_points_to_grid(csv_file, shapefile_path, output_csv)
+    aggregated_df = pd.concat([monthly_frames[i] for i in sorted(monthly_frames)], ignore_index=True)
+    aggregated_df.to_feather(output_file, compression="uncompressed")
+    logger.info(f"✅ Final output saved: {output_file}")
 
-    print(f"🎯 Process completed. Output stored in {request_dir}")
+    logger.info(f"🎯 Process completed. Output stored in {request_dir}")
 
 # # **Example Usage**
 # process_climate_data(
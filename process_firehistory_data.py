@@ -1,9 +1,14 @@
 import os
-import sys
+import logging
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-from shapely.geometry import Point
-from datetime import datetime
+import grid_cache
+
+logger = logging.getLogger(__name__)
+
+# Fire history columns needed for mapping incidents to grid cells
+FIRE_HISTORY_COLUMNS = ['LATITUDE', 'LONGITUDE', 'REP_DATE', 'SIZE_HA', 'CAUSE']
 
 def process_fire_history(province, start_date, end_date, base_output_dir):
     """
@@ -31,77 +36,80 @@ def process_fire_history(province, start_date, end_date, base_output_dir):
     if not os.path.exists(shapefile_path):
         raise FileNotFoundError(f"Shapefile not found: {shapefile_path}")
 
-    output_csv = os.path.join(request_dir, "fire_history_processed.csv")
+    # Parquet keeps the dates and sizes typed, so the merge step does not re-parse text
+    output_file = os.path.join(request_dir, "fire_history_processed.parquet")
 
     # **2️⃣ Load Fire History Data**
-    print(f"Loading fire history data from {fire_history_csv}...")
-    fire_data = pd.read_csv(fire_history_csv, low_memory=False)
+    logger.info(f"Loading fire history data from {fire_history_csv}...")
+    # Only the columns used below, so the other 20 text columns are never parsed
+    fire_data = pd.read_csv(fire_history_csv, usecols=FIRE_HISTORY_COLUMNS, low_memory=False)
     
     # Convert dates and ensure numeric fire size
     fire_data['REP_DATE'] = pd.to_datetime(fire_data['REP_DATE'], errors='coerce')
     fire_data['SIZE_HA'] = pd.to_numeric(fire_data['SIZE_HA'], errors='coerce').fillna(0)
 
     # **3️⃣ Filter Fire Data for Given Date Range**
-    print(f"Filtering fire history between {start_date} and {end_date}...")
-    fire_data_filtered = fire_data[
-        (fire_data['REP_DATE'] >= start_date) & (fire_data['REP_DATE'] <= end_date)
-    ].copy()
+    logger.info(f"Filtering fire history between {start_date} and {end_date}...")
+    # Compared on the raw datetime64 array, with the bounds converted once
+    rep_dates = fire_data['REP_DATE'].to_numpy()
+    in_range = (rep_dates >= np.datetime64(start_date)) & (rep_dates <= np.datetime64(end_date))
+    fire_data_filtered = fire_data.iloc[np.flatnonzero(in_range)].copy()
 
     if fire_data_filtered.empty:
-        print(f"No fire history data found for {province} between {start_date} and {end_date}.")
+        logger.info(f"No fire history data found for {province} between {start_date} and {end_date}.")
         return
 
-    # **4️⃣ Convert Fire Data to GeoDataFrame**
-    fire_data_filtered['geometry'] = fire_data_filtered.apply(
-        lambda row: Point(row['LONGITUDE'], row['LATITUDE']), axis=1
-    )
-    fire_gdf = gpd.GeoDataFrame(fire_data_filtered, geometry='geometry', crs="EPSG:4326")
-
-    # **5️⃣ Load Grid Shapefile**
-    print(f"Loading grid shapefile for {province} from {shapefile_path}...")
-    grid_gdf = gpd.read_file(shapefile_path)
-    
-    # Ensure CRS matches
-    if grid_gdf.crs is None or grid_gdf.crs.to_epsg() != 4326:
-        grid_gdf = grid_gdf.to_crs("EPSG:4326")
+    # **4️⃣ Load Grid Shapefile**
+    logger.info(f"Loading grid shapefile for {province} from {shapefile_path}...")
+    # Shared with the other stages, already in EPSG:4326 with its spatial index built
+    grid_gdf = grid_cache.load_grid(shapefile_path)
 
-    # **6️⃣ Filter Fire Incidents within Grid Bounding Box**
-    print("Filtering fire incidents within grid shapefile's bounding box...")
+    # **5️⃣ Filter Fire Incidents within Grid Bounding Box**
+    logger.info("Filtering fire incidents within grid shapefile's bounding box...")
+    # Plain coordinate comparisons, before any point geometry is built
     minx, miny, maxx, maxy = grid_gdf.total_bounds
-    fire_gdf = fire_gdf.cx[minx:maxx, miny:maxy]
+    lons = fire_data_filtered['LONGITUDE'].to_numpy()
+    lats = fire_data_filtered['LATITUDE'].to_numpy()
+    in_bbox = (lons >= minx) & (lons <= maxx) & (lats >= miny) & (lats <= maxy)
+    fire_data_filtered = fire_data_filtered.iloc[np.flatnonzero(in_bbox)]
 
-    if fire_gdf.empty:
-        print(f"No fire incidents found within the grid of {province}.")
+    if fire_data_filtered.empty:
+        logger.info(f"No fire incidents found within the grid of {province}.")
         return
 
-    # **7️⃣ Spatial Join: Map Fire Incidents to Grid Cells**
-    print("Mapping fire incidents to grid cells...")
-    joined_gdf = gpd.sjoin(fire_gdf, grid_gdf, how="left", predicate="within")
-
-    if 'grid_id' not in joined_gdf.columns:
-        raise ValueError("Spatial join failed. No 'grid_id' found.")
+    # **6️⃣ Build Fire Incident Points** (only the incidents inside the bounding box; the
+    # attribute columns are never copied into a GeoDataFrame)
+    fire_points = gpd.points_from_xy(fire_data_filtered['LONGITUDE'], fire_data_filtered['LATITUDE'], crs="EPSG:4326")
 
-    # **8️⃣ Compute Centroids of Each Grid Cell**
-    projected_gdf = grid_gdf.to_crs("EPSG:3857")  # Reproject for accurate centroids
-    projected_gdf['centroid'] = projected_gdf.geometry.centroid
-    grid_gdf['centroid'] = projected_gdf['centroid'].to_crs("EPSG:4326")
-
-    grid_gdf['Latitude'] = grid_gdf['centroid'].apply(lambda point: point.y)
-    grid_gdf['Longitude'] = grid_gdf['centroid'].apply(lambda point: point.x)
-
-    centroids = grid_gdf[['grid_id', 'Latitude', 'Longitude']]
-
-    # **9️⃣ Merge Centroids with Fire History Data**
-    print("Merging centroid data into fire history records...")
-    final_gdf = joined_gdf.merge(centroids, on='grid_id', how='left')
-
-    # **🔟 Save Final Processed Data**
-    final_gdf = final_gdf[['grid_id', 'Latitude', 'Longitude', 'REP_DATE', 'CAUSE', 'SIZE_HA']]
-    final_gdf = final_gdf.rename(columns={
-        'REP_DATE': 'Date',
-        'CAUSE': 'Fire_Cause',
-        'SIZE_HA': 'Fire_Size_HA'
+    # **7️⃣ Spatial Join: Map Fire Incidents to Grid Cells**
+    logger.info("Mapping fire incidents to grid cells...")
+    # One bulk STRtree query instead of sjoin's frame merges
+    point_idx, cell_idx = grid_gdf.sindex.query(fire_points, predicate="within")
+
+    # Left join: incidents outside every grid cell are kept, without a grid_id
+    unmatched = np.setdiff1d(np.arange(len(fire_points)), point_idx)
+    rows = np.concatenate([point_idx, unmatched])
+    cells = np.concatenate([cell_idx, np.full(len(unmatched), -1)])
+    order = np.argsort(rows, kind="stable")
+    rows, cells = rows[order], cells[order]
+
+    # **8️⃣ Attach Each Cell's Centre** (computed by load_grid), taken by position
+    # rather than merged in on grid_id
+    logger.info("Merging centroid data into fire history records...")
+    matched = cells >= 0
+    cell_rows = np.where(matched, cells, 0)
+    incidents = fire_data_filtered.iloc[rows]
+
+    # **9️⃣ Assemble Final Processed Data** (only the output columns are gathered)
+    final_df = pd.DataFrame({
+        'grid_id': pd.Series(grid_gdf['grid_id'].to_numpy()[cell_rows]).where(matched),
+        'Latitude': np.where(matched, grid_gdf['Latitude'].to_numpy()[cell_rows], np.nan),
+        'Longitude': np.where(matched, grid_gdf['Longitude'].to_numpy()[cell_rows], np.nan),
+        'Date': incidents['REP_DATE'].to_numpy(),
+        'Fire_Cause': incidents['CAUSE'].to_numpy(),
+        'Fire_Size_HA': incidents['SIZE_HA'].to_numpy(),
     })
 
-    final_gdf.to_csv(output_csv, index=False)
-    print(f"✅ Fire history data saved: {output_csv}")
\ No newline at end of file
+    # **🔟 Save Final Processed Data**
+    final_df.to_parquet(output_file, index=False, compression="zstd")
+    logger.info(f"✅ Fire history data saved: {output_file}")
\ No newline at end of file
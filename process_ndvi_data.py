@@ -1,77 +1,26 @@
 import os
-import json
-import requests
+import logging
 import pandas as pd
-import geopandas as gpd
 import rasterio
 import numpy as np
-from datetime import datetime, timedelta
-from shapely.geometry import Point
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import cdse_auth
+import grid_cache
+import raster_helpers
 
-# ✅ Hardcoded credential paths
-CREDENTIALS_FILE = "Data/Credentials/credentials.json"
-ACCESS_TOKEN_FILE = "Data/Credentials/access_token.json"
-TOKEN_URL = "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token"
-PROCESS_URL = "https://sh.dataspace.copernicus.eu/api/v1/process"
+logger = logging.getLogger(__name__)
 
-def log(message: str):
-    """Logging function."""
-    print(message)
-
-def load_access_token():
-    """Load the saved access token."""
-    try:
-        with open(ACCESS_TOKEN_FILE, "r") as f:
-            return json.load(f).get("access_token")
-    except Exception as e:
-        log(f"ERROR: Could not load access token: {e}")
-        return None
-
-def generate_new_access_token():
-    """Generate and save a new access token."""
-    try:
-        with open(CREDENTIALS_FILE, "r") as f:
-            creds = json.load(f)
-            username, password = creds.get("username"), creds.get("password")
-
-        if not username or not password:
-            log("ERROR: Missing username or password in credentials.")
-            return None
-
-        payload = {
-            "client_id": "cdse-public",
-            "username": username,
-            "password": password,
-            "grant_type": "password"
-        }
-
-        log("INFO: Requesting new access token...")
-        response = requests.post(TOKEN_URL, data=payload)
-
-        if response.status_code == 200:
-            access_token = response.json().get("access_token")
-            with open(ACCESS_TOKEN_FILE, "w") as f:
-                json.dump({"access_token": access_token}, f)
-            log("INFO: New access token saved.")
-            return access_token
-        else:
-            log(f"ERROR: Failed to obtain token: {response.text}")
-
-    except Exception as e:
-        log(f"ERROR: Exception during token generation: {e}")
-
-    return None
+# Parallel Process API requests (one per NDVI date)
+MAX_CONCURRENT_REQUESTS = 6
 
 def get_shapefile_bbox(shapefile):
     """Extract bounding box from shapefile."""
     try:
-        gdf = gpd.read_file(shapefile)
-        if gdf.crs is None or gdf.crs.to_epsg() != 4326:
-            gdf = gdf.to_crs("EPSG:4326")
+        gdf = grid_cache.load_grid(shapefile)
         bbox = gdf.total_bounds.tolist()  # [minx, miny, maxx, maxy]
         return bbox
     except Exception as e:
-        log(f"ERROR: Could not extract bounding box from shapefile: {e}")
+        logger.error(f"ERROR: Could not extract bounding box from shapefile: {e}")
         return None
 
 def fetch_ndvi_data(min_lon, min_lat, max_lon, max_lat, date_str, output_file, headers):
@@ -95,7 +44,14 @@ def fetch_ndvi_data(min_lon, min_lat, max_lon, max_lat, date_str, output_file, h
         "evalscript": evalscript,
     }
 
-    response = requests.post(PROCESS_URL, headers=headers, json=payload)
+    response = cdse_auth.SESSION.post(cdse_auth.PROCESS_URL, headers=headers, json=payload)
+    if response.status_code == 401:
+        # Saved token expired: renew it and retry once; the shared headers pass the
+        # new token on to later dates
+        access_token = cdse_auth.renew_access_token(headers["Authorization"].removeprefix("Bearer "))
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+            response = cdse_auth.SESSION.post(cdse_auth.PROCESS_URL, headers=headers, json=payload)
     if response.status_code == 200:
         with open(output_file, "wb") as f:
             f.write(response.content)
@@ -103,28 +59,64 @@ def fetch_ndvi_data(min_lon, min_lat, max_lon, max_lat, date_str, output_file, h
     return False
 
 def map_ndvi_to_grid(ndvi_tif, grid_shapefile):
-    """Map NDVI raster data to a grid shapefile."""
+    """Map NDVI raster data to a grid shapefile as each cell's mean NDVI."""
     try:
         with rasterio.open(ndvi_tif) as src:
             ndvi_array = src.read(1)
-            grid_gdf = gpd.read_file(grid_shapefile).to_crs(src.crs)
-            ndvi_values = []
-
-            for _, row in grid_gdf.iterrows():
-                centroid = row.geometry.centroid
-                col, row_ = src.index(centroid.x, centroid.y)
-                ndvi_values.append(ndvi_array[row_, col])
-
-            grid_gdf['ndvi'] = ndvi_values
-            return grid_gdf[['grid_id', 'ndvi']]
+            # Shared grid, reprojected to the raster's CRS once per request
+            grid_gdf = grid_cache.load_grid(grid_shapefile, src.crs.to_string())
+
+            # Look up every cell centre's pixel at once; centres off the raster get NaN.
+            # Centres come straight from the bounds (small cells), not a centroid per polygon
+            bounds = grid_gdf.geometry.bounds.to_numpy()
+            center_x = (bounds[:, 0] + bounds[:, 2]) * 0.5
+            center_y = (bounds[:, 1] + bounds[:, 3]) * 0.5
+            rows, cols = rasterio.transform.rowcol(src.transform, center_x, center_y)
+            rows, cols = np.asarray(rows), np.asarray(cols)
+            valid = (0 <= rows) & (rows < ndvi_array.shape[0]) & (0 <= cols) & (cols < ndvi_array.shape[1])
+
+            centroid_ndvi = np.where(valid, ndvi_array[np.where(valid, rows, 0), np.where(valid, cols, 0)], np.nan)
+
+            # Average every pixel inside each cell; cells too small to cover a pixel centre
+            # keep their centroid pixel
+            labels = raster_helpers.rasterize_grid(grid_gdf, ndvi_array.shape, src.transform)
+            mean_ndvi = raster_helpers.zonal_mean(ndvi_array, labels, len(grid_gdf))
+            ndvi = np.where(np.isnan(mean_ndvi), centroid_ndvi, mean_ndvi)
+            return pd.DataFrame({'grid_id': grid_gdf['grid_id'].to_numpy(), 'ndvi': ndvi})
     except Exception as e:
-        log(f"ERROR: Failed to map NDVI: {e}")
+        logger.error(f"ERROR: Failed to map NDVI: {e}")
         return None
 
 def interpolate_ndvi(ndvi_df):
     """Interpolate NDVI to daily values."""
-    ndvi_pivot = ndvi_df.pivot(index='grid_id', columns='date', values='ndvi').interpolate(axis=1, method='linear')
-    return ndvi_pivot.reset_index().melt(id_vars='grid_id', var_name='date', value_name='ndvi')
+    # (grid, date) matrix built from factorized keys rather than a pivot table
+    grid_codes, grid_ids = pd.factorize(ndvi_df['grid_id'], sort=True)
+    date_codes, dates = pd.factorize(ndvi_df['date'], sort=True)
+    ndvi = np.full((len(grid_ids), len(dates)), np.nan)
+    ndvi[grid_codes, date_codes] = ndvi_df['ndvi'].to_numpy()
+
+    # Linear fill along each row between its neighbouring valid dates, as
+    # DataFrame.interpolate(axis=1) does: gaps after the last valid value take
+    # that value, gaps before the first stay NaN
+    positions = np.arange(len(dates))
+    valid = ~np.isnan(ndvi)
+    prev_idx = np.maximum.accumulate(np.where(valid, positions, -1), axis=1)
+    next_idx = np.minimum.accumulate(np.where(valid, positions, len(dates))[:, ::-1], axis=1)[:, ::-1]
+    has_prev, has_next = prev_idx >= 0, next_idx < len(dates)
+    rows = np.arange(len(grid_ids))[:, None]
+    prev_val = ndvi[rows, np.maximum(prev_idx, 0)]
+    next_val = np.where(has_next, ndvi[rows, np.minimum(next_idx, len(dates) - 1)], prev_val)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = np.where(has_next, (positions - prev_idx) / (next_idx - prev_idx), 0.0)
+    filled = np.where(has_prev, prev_val + (next_val - prev_val) * weight, np.nan)
+    ndvi = np.where(valid, ndvi, filled)
+
+    # Long format, date by date (grid_id within each date)
+    return pd.DataFrame({
+        'grid_id': np.tile(grid_ids, len(dates)),
+        'date': np.repeat(dates, len(grid_ids)),
+        'ndvi': ndvi.T.reshape(-1),
+    })
 
 def process_ndvi_data(province, start_date, end_date, base_output_dir):
     """Main function to fetch and process NDVI data."""
@@ -134,36 +126,45 @@ def process_ndvi_data(province, start_date, end_date, base_output_dir):
     shapefile_path = f"Data/Grid/{province}/{province.replace(' ', '_')}_Grid.shp"
     bbox = get_shapefile_bbox(shapefile_path)
     if not bbox:
-        log("ERROR: Invalid shapefile for bounding box.")
+        logger.error("ERROR: Invalid shapefile for bounding box.")
         return
 
-    access_token = generate_new_access_token()
+    access_token = cdse_auth.get_access_token()
     if not access_token:
-        log("ERROR: Unable to get API token.")
+        logger.error("ERROR: Unable to get API token.")
         return
 
     headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
     min_lon, min_lat, max_lon, max_lat = bbox
-    ndvi_records = []
 
-    date_range = pd.date_range(start=start_date, end=end_date, freq="5D")
-    for date_str in date_range.strftime("%Y-%m-%d"):
+    def fetch_and_map(date_str):
         output_tif = os.path.join(ndvi_dir, f"ndvi_{date_str}.tif")
         if fetch_ndvi_data(min_lon, min_lat, max_lon, max_lat, date_str, output_tif, headers):
             ndvi_df = map_ndvi_to_grid(output_tif, shapefile_path)
             if ndvi_df is not None:
                 ndvi_df['date'] = date_str
-                ndvi_records.append(ndvi_df)
+                return ndvi_df
+        return None
+
+    # Downloads are network-bound, so several dates are fetched at once
+    date_range = pd.date_range(start=start_date, end=end_date, freq="5D")
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        futures = {executor.submit(fetch_and_map, date_str): date_str for date_str in date_range.strftime("%Y-%m-%d")}
+        results = {futures[future]: future.result() for future in as_completed(futures)}
+
+    ndvi_records = [results[date_str] for date_str in sorted(results) if results[date_str] is not None]
 
     if ndvi_records:
         processed_ndvi = pd.concat(ndvi_records, ignore_index=True)
-        processed_ndvi.to_csv(os.path.join(ndvi_dir, "processed_ndvi.csv"), index=False)
+        # Parquet rather than CSV, so the merge step reloads typed columns without parsing
+        processed_ndvi.to_parquet(os.path.join(ndvi_dir, "processed_ndvi.parquet"), index=False, compression="zstd")
 
         interpolated_ndvi = interpolate_ndvi(processed_ndvi)
-        interpolated_ndvi.to_csv(os.path.join(ndvi_dir, "interpolated_ndvi.csv"), index=False)
-        log("INFO: NDVI processing completed.")
+        interpolated_ndvi.to_parquet(os.path.join(ndvi_dir, "interpolated_ndvi.parquet"), index=False, compression="zstd")
+        logger.info("INFO: NDVI processing completed.")
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     print("🚀 Starting NDVI Processing...")
     
     province = "Alberta"
@@ -171,11 +172,7 @@ def main():
     end_date = "2023-01-05"
     base_output_dir = "/Users/dheemanth/Desktop/Forest Fire Data Tool Application/App/Output/Requests/Request_20250203_0158"
 
-    # Check if the directory exists
-    if not os.path.exists(base_output_dir):
-        print(f"⚠️ Base output directory '{base_output_dir}' does not exist. Creating it...")
-        os.makedirs(base_output_dir, exist_ok=True)
-
+    # process_ndvi_data creates its NDVI subfolder, and with it the base directory
     print(f"✅ Output will be saved in: {base_output_dir}")
 
     # Run NDVI Processing
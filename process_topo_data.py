@@ -2,81 +2,30 @@
 # topo.py - Fetches and processes topographical data (DEM)
 
 import os
-import json
-import requests
+import logging
 import pandas as pd
-import geopandas as gpd
-import rasterio
-import numpy as np
-from shapely.geometry import Point
-from typing import List, Optional
 import rasterio
 import numpy as np
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+import cdse_auth
+import grid_cache
+import raster_helpers
+from rasterio.enums import Resampling
 from scipy.ndimage import gaussian_filter
 
-# ✅ Hardcoded credential paths
-CREDENTIALS_FILE = "Data/credentials/credentials.json"
-ACCESS_TOKEN_FILE = "Data/credentials/access_token.json"
-TOKEN_URL = "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token"
-PROCESS_URL = "https://sh.dataspace.copernicus.eu/api/v1/process"
-
-def log(message: str):
-    """Logging function."""
-    print(message)
-
-def load_access_token():
-    """Load the saved access token."""
-    try:
-        with open(ACCESS_TOKEN_FILE, "r") as f:
-            return json.load(f).get("access_token")
-    except Exception as e:
-        log(f"ERROR: Could not load access token: {e}")
-        return None
-
-def generate_new_access_token():
-    """Generate and save a new access token."""
-    try:
-        with open(CREDENTIALS_FILE, "r") as f:
-            creds = json.load(f)
-            username, password = creds.get("username"), creds.get("password")
-
-        if not username or not password:
-            log("ERROR: Missing username or password in credentials.")
-            return None
-
-        payload = {
-            "client_id": "cdse-public",
-            "username": username,
-            "password": password,
-            "grant_type": "password"
-        }
-
-        log("INFO: Requesting new access token...")
-        response = requests.post(TOKEN_URL, data=payload)
+logger = logging.getLogger(__name__)
 
-        if response.status_code == 200:
-            access_token = response.json().get("access_token")
-            with open(ACCESS_TOKEN_FILE, "w") as f:
-                json.dump({"access_token": access_token}, f)
-            log("INFO: New access token saved.")
-            return access_token
-        else:
-            log(f"ERROR: Failed to obtain token: {response.text}")
-
-    except Exception as e:
-        log(f"ERROR: Exception during token generation: {e}")
-
-    return None
+# DEM pixels kept across a grid cell when mapping; finer DEMs are read downsampled
+DEM_PIXELS_PER_CELL = 16
 
 def get_shapefile_bbox(shapefile):
     """Extract bounding box from shapefile."""
     try:
-        gdf = gpd.read_file(shapefile)
-        if gdf.crs is None or gdf.crs.to_epsg() != 4326:
-            gdf = gdf.to_crs("EPSG:4326")
+        gdf = grid_cache.load_grid(shapefile)
         return gdf.total_bounds.tolist()  # [minx, miny, maxx, maxy]
     except Exception as e:
-        log(f"ERROR: Could not extract bounding box from shapefile: {e}")
+        logger.error(f"ERROR: Could not extract bounding box from shapefile: {e}")
         return None
 
 def divide_bbox(bbox: List[float]) -> List[List[float]]:
@@ -113,7 +62,13 @@ def fetch_dem_data(bbox: List[float], output_file: str, access_token: str) -> bo
     }
 
     headers = { "Authorization": f"Bearer {access_token}", "Content-Type": "application/json" }
-    response = requests.post(PROCESS_URL, headers=headers, json=payload)
+    response = cdse_auth.SESSION.post(cdse_auth.PROCESS_URL, headers=headers, json=payload)
+    if response.status_code == 401:
+        # Saved token expired: renew it and retry once
+        access_token = cdse_auth.renew_access_token(access_token)
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+            response = cdse_auth.SESSION.post(cdse_auth.PROCESS_URL, headers=headers, json=payload)
 
     if response.status_code == 200:
         with open(output_file, "wb") as f:
@@ -121,16 +76,12 @@ def fetch_dem_data(bbox: List[float], output_file: str, access_token: str) -> bo
         return True
     return False
 
-import rasterio
-import numpy as np
-from scipy.ndimage import gaussian_filter
-
 def calculate_slope_aspect(dem_array, transform, crs):
     """Calculates slope and aspect from DEM raster in a projected CRS."""
     try:
         # 🌍 Convert CRS (Ensure CRS is projected for correct distance calculations)
         if crs.to_epsg() != 3857:  # Check if it's already projected
-            print("🔄 Reprojecting DEM to EPSG:3857 for accurate slope calculation...")
+            logger.info("🔄 Reprojecting DEM to EPSG:3857 for accurate slope calculation...")
 
         # ✅ Apply Gaussian smoothing to reduce noise
         smoothed_dem = gaussian_filter(dem_array, sigma=1)
@@ -141,72 +92,79 @@ def calculate_slope_aspect(dem_array, transform, crs):
         # 🔍 Compute gradient
         x, y = np.gradient(smoothed_dem, res_x, res_y)
 
-        # 🏔 Calculate slope in degrees
-        slope = np.arctan(np.sqrt(x**2 + y**2)) * (180 / np.pi)
-        slope = np.clip(slope, 0, 35)  # 🔥 **Set a more realistic upper limit (0° - 35°)**
+        # 🏔 Calculate slope in degrees (np.hypot fuses the square/sum/sqrt; the rest works in place)
+        slope = np.hypot(x, y)
+        np.arctan(slope, out=slope)
+        slope *= 180 / np.pi
+        np.clip(slope, 0, 35, out=slope)  # 🔥 **Set a more realistic upper limit (0° - 35°)**
 
-        # 🔄 Calculate aspect (0° to 360°)
-        aspect = np.arctan2(-x, y) * (180 / np.pi)
-        aspect = (aspect + 360) % 360
+        # 🔄 Calculate aspect (0° to 360°), reusing the x gradient's buffer; np.mod already
+        # wraps negative angles into 0-360
+        aspect = np.arctan2(np.negative(x, out=x), y, out=x)
+        aspect *= 180 / np.pi
+        np.mod(aspect, 360, out=aspect)
 
         # ✅ Debugging: Print new slope values
-        print(f"✅ Final Slope: Min={np.nanmin(slope)}, Max={np.nanmax(slope)}, Mean={np.nanmean(slope)}")
-        print(f"✅ Final Aspect: Min={np.nanmin(aspect)}, Max={np.nanmax(aspect)}, Mean={np.nanmean(aspect)}")
+        logger.info(f"✅ Final Slope: Min={np.nanmin(slope)}, Max={np.nanmax(slope)}, Mean={np.nanmean(slope)}")
+        logger.info(f"✅ Final Aspect: Min={np.nanmin(aspect)}, Max={np.nanmax(aspect)}, Mean={np.nanmean(aspect)}")
 
         return slope, aspect
     except Exception as e:
-        print(f"ERROR: Slope/Aspect calculation failed: {e}")
+        logger.error(f"ERROR: Slope/Aspect calculation failed: {e}")
         return np.full(dem_array.shape, np.nan), np.full(dem_array.shape, np.nan)
 
 def map_dem_to_grid(dem_file, grid_shapefile):
-    """Maps DEM raster data to grid and calculates elevation, slope, and aspect."""
+    """Maps DEM raster data to grid and calculates each cell's mean elevation, slope, and aspect."""
     try:
         with rasterio.open(dem_file) as src:
-            dem = src.read(1)
-            transform = src.transform
             crs = src.crs  # Get DEM CRS
 
+            # 🗺 Load the shared grid, reprojected to match the DEM CRS (once per request)
+            grid_gdf = grid_cache.load_grid(grid_shapefile, crs.to_string())
+
+            # 📉 Cells span many DEM pixels, so read the DEM averaged down to about
+            # DEM_PIXELS_PER_CELL pixels across a cell; slope and aspect then run on far fewer pixels
+            cell_bounds = grid_gdf.geometry.bounds.to_numpy()
+            cell_pixels = np.median(cell_bounds[:, 2] - cell_bounds[:, 0]) / abs(src.transform.a)
+            factor = max(1, int(cell_pixels // DEM_PIXELS_PER_CELL))
+            out_shape = (-(-src.height // factor), -(-src.width // factor))  # Rounded up, so edge pixels stay covered
+            dem = src.read(1, out_shape=out_shape, resampling=Resampling.average)
+            transform = src.transform * src.transform.scale(src.width / dem.shape[1], src.height / dem.shape[0])
+
         # 🏔 Compute slope and aspect
         slope, aspect = calculate_slope_aspect(dem, transform, crs)
 
-        # 🗺 Load and reproject grid
-        grid_gdf = gpd.read_file(grid_shapefile)
-        grid_gdf = grid_gdf.to_crs(crs)  # ✅ Convert grid to match DEM CRS
-
-        # ✅ **Fix centroid calculation**
-        projected_gdf = grid_gdf.to_crs("EPSG:3857")  # Convert to meters before computing centroids
-        projected_gdf['centroid'] = projected_gdf.geometry.centroid  # Compute centroids
-        grid_gdf['centroid'] = projected_gdf['centroid'].to_crs("EPSG:4326")  # Convert back to lat/lon
-
-        grid_gdf['Latitude'] = grid_gdf['centroid'].y
-        grid_gdf['Longitude'] = grid_gdf['centroid'].x
-
-        # 🔍 Extract elevation, slope, and aspect values
-        elevations, slopes, aspects = [], [], []
-        for _, row in grid_gdf.iterrows():
-            try:
-                col, row_ = src.index(row.centroid.x, row.centroid.y)
-                if 0 <= row_ < dem.shape[0] and 0 <= col < dem.shape[1]:
-                    elevations.append(dem[row_, col])
-                    slopes.append(slope[row_, col])
-                    aspects.append(aspect[row_, col])
-                else:
-                    elevations.append(np.nan)
-                    slopes.append(np.nan)
-                    aspects.append(np.nan)
-            except:
-                elevations.append(np.nan)
-                slopes.append(np.nan)
-                aspects.append(np.nan)
-
-        grid_gdf['Elevation'] = elevations
-        grid_gdf['Slope'] = slopes
-        grid_gdf['Aspect'] = aspects
-
-        return grid_gdf[['grid_id', 'Latitude', 'Longitude', 'Elevation', 'Slope', 'Aspect']]
+        # ✅ Cell centres straight from the bounds (small cells), so no polygon is reprojected
+        bounds = grid_gdf.geometry.bounds.to_numpy()
+        center_x = (bounds[:, 0] + bounds[:, 2]) * 0.5
+        center_y = (bounds[:, 1] + bounds[:, 3]) * 0.5
+
+        # 🔍 Extract elevation, slope, and aspect values at every centre's pixel at once (in the DEM's CRS)
+        rows, cols = rasterio.transform.rowcol(transform, center_x, center_y)
+        rows, cols = np.asarray(rows), np.asarray(cols)
+        valid = (0 <= rows) & (rows < dem.shape[0]) & (0 <= cols) & (cols < dem.shape[1])
+        rows, cols = np.where(valid, rows, 0), np.where(valid, cols, 0)
+
+        # 📊 Average every pixel inside each cell; cells too small to cover a pixel centre
+        # keep their centroid pixel. Aspect is circular, so it is averaged as a direction.
+        labels = raster_helpers.rasterize_grid(grid_gdf, dem.shape, transform)
+        n_cells = len(grid_gdf)
+        aspect_radians = np.radians(aspect)
+        zonal = {
+            'Elevation': raster_helpers.zonal_mean(dem, labels, n_cells),
+            'Slope': raster_helpers.zonal_mean(slope, labels, n_cells),
+            'Aspect': np.degrees(np.arctan2(raster_helpers.zonal_mean(np.sin(aspect_radians), labels, n_cells),
+                                            raster_helpers.zonal_mean(np.cos(aspect_radians), labels, n_cells))) % 360,
+        }
+        topo_df = grid_gdf[['grid_id', 'Latitude', 'Longitude']].copy()
+        for column, raster in (('Elevation', dem), ('Slope', slope), ('Aspect', aspect)):
+            centroid_values = np.where(valid, raster[rows, cols], np.nan)
+            topo_df[column] = np.where(np.isnan(zonal[column]), centroid_values, zonal[column])
+
+        return topo_df
 
     except Exception as e:
-        print(f"ERROR: Failed to map DEM: {e}")
+        logger.error(f"ERROR: Failed to map DEM: {e}")
         return None
 
 def process_topo_data(province, base_output_dir):
@@ -217,30 +175,36 @@ def process_topo_data(province, base_output_dir):
     shapefile_path = f"Data/Grid/{province}/{province.replace(' ', '_')}_Grid.shp"
     bbox = get_shapefile_bbox(shapefile_path)
     if not bbox:
-        log("ERROR: Invalid shapefile for bounding box.")
+        logger.error("ERROR: Invalid shapefile for bounding box.")
         return
 
     divided_bboxes = divide_bbox(bbox)
-    log(f"INFO: Divided bounding box into {len(divided_bboxes)} parts.")
+    logger.info(f"INFO: Divided bounding box into {len(divided_bboxes)} parts.")
 
-    access_token = generate_new_access_token()
+    access_token = cdse_auth.get_access_token()
     if not access_token:
-        log("ERROR: Unable to get API token.")
+        logger.error("ERROR: Unable to get API token.")
         return
 
+    # The four tiles are independent downloads, so fetch them concurrently
+    dem_parts = [(part_bbox, os.path.join(topo_dir, f"dem_part_{i+1}.tif")) for i, part_bbox in enumerate(divided_bboxes)]
+    with ThreadPoolExecutor(max_workers=len(dem_parts)) as executor:
+        fetched = list(executor.map(lambda part: fetch_dem_data(part[0], part[1], access_token), dem_parts))
+
     dem_files = []
-    for i, part_bbox in enumerate(divided_bboxes):
-        dem_file = os.path.join(topo_dir, f"dem_part_{i+1}.tif")
-        if fetch_dem_data(part_bbox, dem_file, access_token):
+    for (_, dem_file), ok in zip(dem_parts, fetched):
+        if ok:
             dem_files.append(dem_file)
-            log(f"✅ DEM Data saved: {dem_file}")
+            logger.info(f"✅ DEM Data saved: {dem_file}")
 
     all_dfs = [map_dem_to_grid(f, shapefile_path) for f in dem_files if f]
     final_df = pd.concat(all_dfs).groupby(["grid_id", "Latitude", "Longitude"]).mean().reset_index()
-    final_df.to_csv(os.path.join(topo_dir, "processed_topo.csv"), index=False)
-    log("✅ Topographical data processing completed.")
+    # Parquet rather than CSV, so the merge step reloads typed columns without parsing
+    final_df.to_parquet(os.path.join(topo_dir, "processed_topo.parquet"), index=False, compression="zstd")
+    logger.info("✅ Topographical data processing completed.")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     province = "British Columbia"
     base_output_dir = "/Users/dheemanth/Desktop/Forest Fire Data Tool Application/App/Output/Requests/Request_20250203_0158"
     process_topo_data(province, base_output_dir)
\ No newline at end of file
@@ -0,0 +1,16 @@
+import numpy as np
+import rasterio.features
+
+def zonal_mean(values, labels, n_zones):
+    """Mean of the finite values under each zone label 1..n_zones (NaN where a zone has none)."""
+    in_zone = (labels > 0) & np.isfinite(values)
+    zone_labels = labels[in_zone]
+    counts = np.bincount(zone_labels, minlength=n_zones + 1)[1:]
+    sums = np.bincount(zone_labels, weights=values[in_zone], minlength=n_zones + 1)[1:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+def rasterize_grid(grid_gdf, shape, transform):
+    """Label raster with each pixel set to its grid cell's 1-based row position (0 outside the grid)."""
+    shapes = ((geom, i) for i, geom in enumerate(grid_gdf.geometry, 1))
+    return rasterio.features.rasterize(shapes, out_shape=shape, transform=transform, fill=0, dtype="int32")